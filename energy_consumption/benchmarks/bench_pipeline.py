@@ -0,0 +1,248 @@
+"""
+Benchmarks of the analysis pipeline on synthetic EnergiBridge campaigns.
+
+For each size, a campaign with about that many log samples is generated with
+src/synthetic.py (and kept under .cache/bench/ for later runs), and the
+analysis steps are run on it with the wall time, the tracemalloc peak and the
+process's peak RSS recorded. Results are written to benchmarks/results/ as one
+JSON file per run, named after the commit, so runs on different commits can be
+compared.
+
+Usage (from the energy_consumption directory):
+  python benchmarks/bench_pipeline.py run [--sizes 1e4 1e5 1e6] [--no-memory]
+  python benchmarks/bench_pipeline.py compare OLD.json NEW.json [--threshold 1.1] [--min-seconds 0.05]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+
+import numpy as np
+import pandas as pd
+
+import energy_cache
+import process_energy as pe
+import plot_results
+import synthetic
+from config import ENERGY_LOG_FILE, TIMESTAMPS_FILE
+from instrumentation import log_message
+from stats_engine import StatsEngine
+from time_bins import time_binned_aggregates
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DATA_DIR = os.path.join(ROOT_DIR, energy_cache.CACHE_DIR, "bench")
+DEFAULT_SIZES = [1e4, 1e5, 1e6]
+INTERVAL_MS = 50  # Sampling interval of the synthetic campaigns
+MAX_IN_MEMORY = 2e7  # Larger logs skip load_data and are only analysed with the streaming reader
+SEED = 0
+
+
+def git_commit():
+    """(commit hash, dirty flag) of the working tree, or ("unknown", None) outside git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", None
+    return commit, bool(status.strip())
+
+
+def max_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is in KB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+def campaign_dir(samples):
+    """Directory holding the synthetic campaign of about `samples` rows, generated if missing or stale."""
+    path = os.path.join(DATA_DIR, f"{int(samples)}-{SEED}")
+    meta_file = os.path.join(path, "campaign.json")
+    source_hash = energy_cache.file_hash(synthetic.__file__)
+    try:
+        with open(meta_file) as f:
+            meta = json.load(f)
+        if meta["source_hash"] == source_hash and meta["interval_ms_requested"] == INTERVAL_MS:
+            return path, meta
+    except (OSError, ValueError, KeyError):
+        pass
+    shutil.rmtree(path, ignore_errors=True)
+    log_message(f"Generating a synthetic campaign of about {int(samples)} samples in {path}")
+    start = time.perf_counter()
+    meta = synthetic.generate(path, interval_ms=INTERVAL_MS, samples=int(samples), seed=SEED)
+    meta.update(source_hash=source_hash, interval_ms_requested=INTERVAL_MS,
+                generate_s=time.perf_counter() - start)
+    with open(meta_file, "w") as f:
+        json.dump(meta, f, indent=2)
+    return path, meta
+
+
+@contextmanager
+def measured(records, samples, name, memory):
+    """Record the wall time and memory peaks of the block as one result row."""
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2**20 if memory else None
+        if memory:
+            tracemalloc.stop()
+        records.append({"samples": int(samples), "benchmark": name, "seconds": seconds,
+                        "peak_mb": peak, "max_rss_mb": max_rss_mb()})
+        log_message(f"{name}: {seconds:.3f} s" + (f", peak {peak:.1f} MB" if memory else ""))
+
+
+def warm_up():
+    """Import the lazily loaded libraries, so their import time is not counted in the first benchmark."""
+    plot_results._init_worker({})
+    pe.stats.shapiro, plot_results.sns.boxplot, plot_results.plt.figure
+
+
+def bench_size(samples, memory, window_workers):
+    """Run every benchmark on the campaign of about `samples` rows; returns (result rows, campaign)."""
+    path, campaign = campaign_dir(samples)
+    records = []
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        shutil.rmtree(energy_cache.CACHE_DIR, ignore_errors=True)
+        if campaign["samples"] <= MAX_IN_MEMORY:
+            with measured(records, samples, "load_data (parse)", memory):
+                timestamps_df, energy_df = pe.load_data(TIMESTAMPS_FILE, ENERGY_LOG_FILE)
+            del timestamps_df, energy_df
+            with measured(records, samples, "load_data (cached)", memory):
+                timestamps_df, energy_df = pe.load_data(TIMESTAMPS_FILE, ENERGY_LOG_FILE)
+            timestamps_df = pe.prepare_timestamps(timestamps_df.copy())
+            with measured(records, samples, "calculate_energy_consumption", memory):
+                results_df, sample_df = pe.calculate_energy_consumption(timestamps_df, energy_df)
+            if window_workers > 1:
+                with measured(records, samples, f"calculate_energy_consumption_parallel ({window_workers} workers)", memory):
+                    pe.calculate_energy_consumption_parallel(timestamps_df, energy_df, window_workers)
+            del energy_df, sample_df
+        else:
+            log_message(f"Skipping the in-memory steps: more than {MAX_IN_MEMORY:.0e} samples.")
+            timestamps_df = pe.prepare_timestamps(pd.read_csv(TIMESTAMPS_FILE))
+        with measured(records, samples, "calculate_energy_consumption_streaming", memory):
+            results_df, sample_df = pe.calculate_energy_consumption_streaming(timestamps_df, ENERGY_LOG_FILE)
+
+        with measured(records, samples, "statistical_tests", memory):
+            pe.statistical_tests(results_df)
+        pairwise = []
+        for metric in ["Total Energy (J)", "Average Power (W)"]:
+            with measured(records, samples, f"pairwise_comparisons_metric ({metric})", memory):
+                pairwise.append(pe.pairwise_comparisons_metric(results_df, metric, stats_engine=StatsEngine(results_df)))
+
+        with measured(records, samples, "time_binned_aggregates", memory):
+            time_bins_df = time_binned_aggregates(sample_df)
+        with measured(records, samples, "power_traces", memory):
+            traces_df = plot_results.power_traces(sample_df)
+        frames = {"results": results_df, "time_bins": time_bins_df, "traces": traces_df,
+                  "pairwise": pd.concat(pairwise, ignore_index=True), "timestamps": timestamps_df}
+        plot_results.ensure_dir(plot_results.SAVE_FIG_DIR)
+        with measured(records, samples, "plot_results", memory):
+            plot_results.render_figures(plot_results.figure_jobs(frames), frames, workers=1, render_all=True)
+    finally:
+        os.chdir(cwd)
+    return records, campaign
+
+
+def run(args):
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "memory_profiled": not args.no_memory,
+        "cpus": os.cpu_count(),
+        "campaigns": [],
+        "results": [],
+    }
+    warm_up()
+    for samples in args.sizes:
+        records, campaign = bench_size(samples, not args.no_memory, args.window_workers)
+        report["campaigns"].append({"size": int(samples), **campaign})
+        report["results"] += records
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    out_file = os.path.join(args.out_dir, f"{stamp}-{commit[:10]}{'-dirty' if dirty else ''}.json")
+    with open(out_file, "w") as f:
+        json.dump(report, f, indent=2)
+    log_message(f"Benchmark results saved to {out_file}")
+    return 0
+
+
+def compare(args):
+    """Print the time and memory ratio of each benchmark in NEW to OLD; exit status 1 on regressions."""
+    reports = []
+    for path in (args.old, args.new):
+        with open(path) as f:
+            reports.append(json.load(f))
+    old, new = (pd.DataFrame(report["results"]).set_index(["samples", "benchmark"]) for report in reports)
+    table = old[["seconds", "peak_mb"]].join(new[["seconds", "peak_mb"]], lsuffix=" old", rsuffix=" new", how="inner")
+    table["time ratio"] = table["seconds new"] / table["seconds old"]
+    table["memory ratio"] = table["peak_mb new"] / table["peak_mb old"]
+    # Steps faster than min_seconds are too noisy to compare
+    slower = (table["time ratio"] > args.threshold) & (table["seconds new"] >= args.min_seconds)
+    regressed = slower | (table["memory ratio"] > args.threshold)
+    table["regression"] = np.where(regressed, "<<", "")
+
+    print(f"old: {reports[0]['commit'][:10]} ({reports[0]['date']}, {reports[0]['host']})")
+    print(f"new: {reports[1]['commit'][:10]} ({reports[1]['date']}, {reports[1]['host']})")
+    with pd.option_context("display.max_rows", None, "display.width", 200, "display.max_columns", None, "display.float_format", "{:.3f}".format):
+        print(table)
+    if reports[0]["host"] != reports[1]["host"]:
+        print("Warning: the runs are from different hosts; timings are not comparable.")
+    print(f"{int(regressed.sum())} of {len(table)} benchmarks slower or larger by more than {args.threshold:.2f}x.")
+    return 1 if regressed.any() else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on synthetic campaigns.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Run the benchmarks and save the results")
+    run_parser.add_argument("--sizes", nargs="+", type=float, default=DEFAULT_SIZES,
+                            help="Approximate log samples per campaign (default 1e4 1e5 1e6, up to 1e8)")
+    run_parser.add_argument("--no-memory", action="store_true",
+                            help="Skip tracemalloc, which slows allocation-heavy steps down")
+    run_parser.add_argument("--window-workers", type=int, default=os.cpu_count() or 1,
+                            help="Processes for the parallel window benchmark (default: number of CPUs; 1 skips it)")
+    run_parser.add_argument("--out-dir", default=RESULTS_DIR, help="Directory for the result JSON files")
+    run_parser.set_defaults(func=run)
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=1.1,
+                                help="Ratio above which a benchmark counts as a regression (default 1.1)")
+    compare_parser.add_argument("--min-seconds", type=float, default=0.05,
+                                help="Ignore time regressions of steps faster than this (default 0.05)")
+    compare_parser.set_defaults(func=compare)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(args.func(args))
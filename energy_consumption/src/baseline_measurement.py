@@ -2,11 +2,11 @@ import os
 import random
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import pandas as pd
 import socket
 import platform
-import csv
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -19,24 +19,25 @@ from selenium.common.exceptions import (
 
 from selenium.webdriver.common.action_chains import ActionChains
 
+from baseline_store import (BASELINE_MAX_AGE_DAYS, append_runs, driver_environment, load_store,
+                            reusable_baselines)
+from config import BASELINE_FILE, BASELINE_STORE_FILE, SEARCH_ENGINES, load_baseline_overhead
+from driver_pool import DriverPool
+from instrumentation import count, log_message, span
+from page_scripts import find_first
+
+BASELINE_WORKERS = int(os.getenv("BASELINE_WORKERS", 1))  # Engines measured at the same time
+HIDE_WEBDRIVER_SCRIPT = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+
 def handle_startpage(driver, query):
     try:
         # Wait for the search box with multiple possible selectors
-        search_box = None
         selectors = [
             (By.NAME, "query"),
             (By.CSS_SELECTOR, "input[type='text']"),
             (By.CSS_SELECTOR, "input[type='search']")
         ]
-        
-        for selector_type, selector_value in selectors:
-            try:
-                search_box = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((selector_type, selector_value))
-                )
-                break
-            except TimeoutException:
-                continue
+        search_box, _ = find_first(driver, selectors, timeout=5)
         
         if search_box:
             # Clear using JavaScript
@@ -96,7 +97,7 @@ def setup_driver(max_attempts=3):
             driver = webdriver.Chrome(options=options)
             driver.set_page_load_timeout(300)
             driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {
-                "source": "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+                "source": HIDE_WEBDRIVER_SCRIPT
             })
             return driver
         except WebDriverException as e:
@@ -104,9 +105,11 @@ def setup_driver(max_attempts=3):
             if attempt < max_attempts - 1:
                 time.sleep(10)
     return None
-def log_message(message):
-    """Print a timestamped log message."""
-    print(f"[{datetime.now()}] {message}")
+
+
+def new_driver_pool(size=1):
+    """Pool of warm drivers from setup_driver, each session in a fresh browser context."""
+    return DriverPool(setup_driver, size, init_script=HIDE_WEBDRIVER_SCRIPT)
 
 
 def safe_click(driver, element, fallback_js=True):
@@ -279,92 +282,152 @@ def accept_cookie(driver, engine):
         except TimeoutException:
             log_message(f"No cookie dialog for {engine}")
 
-def store_baseline_to_csv(engine, average_baseline, filename='baseline_results.csv'):
-    # Open in write mode to start a new file each time
-    with open(filename, 'w', newline='') as csvfile:
-        fieldnames = ['Search Engine', 'Baseline Duration (ms)']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()  # Write header as the first row
-        writer.writerow({
-            'Search Engine': engine,
-            'Baseline Duration (ms)': average_baseline
-        })
-
-
-def measure_baseline(engine, url, iterations=1):
+def measure_baseline(engine, url, iterations=1, pool=None):
     """
     Measures the baseline overhead for an engine by performing minimal automation steps,
     including accepting cookies.
+
+    Each iteration runs in a fresh browser context of a warm driver from
+    `pool` (a new single-driver pool if None), so the launch of Chrome is
+    not part of the baseline and every page load starts with a cold cache.
+    Returns None if no iteration produced a usable duration.
     """
+    baseline_durations = measure_baseline_durations(engine, url, iterations, pool)
+    if not baseline_durations:
+        log_message(f"Warning: no usable baseline iterations for {engine}")
+        return None
+    average_baseline = sum(baseline_durations) / len(baseline_durations)
+    log_message(f"Average baseline for {engine}: {average_baseline} ms")
+
+    return average_baseline
+
+
+def measure_baseline_durations(engine, url, iterations=1, pool=None):
+    """The baseline durations (ms) of measure_baseline's iterations, without the abnormally large ones."""
+    if pool is None:
+        with new_driver_pool() as pool:
+            return measure_baseline_durations(engine, url, iterations, pool)
+
     baseline_durations = []
     for _ in range(iterations):
         log_message(f"Measuring baseline for {engine}")
-        start_time = int(datetime.now().timestamp() * 1000)  # in ms
-        driver = setup_driver()
-        time.sleep(random.uniform(0.5, 1.5))
-        driver.get(url)
-        time.sleep(random.uniform(1.5, 3.0))
+        try:
+            with pool.session() as driver:
+                start_time = int(datetime.now().timestamp() * 1000)  # in ms
+                time.sleep(random.uniform(0.5, 1.5))
+                with span("page load"):
+                    driver.get(url)
+                time.sleep(random.uniform(1.5, 3.0))
 
-        handle_startpage(driver, "angular route uib tab")
-        
-        # Accept cookie to include its overhead in the baseline
-        if engine == "Yahoo":
-            if not accept_cookie(driver, engine):
-                log_message(f"Could not accept cookies for {engine}; proceeding without")
-                log_message("Defaulting to predefined baseline for Yahoo (21676 ms)")
-                baseline_duration = 21676
-            else:
-                log_message(f"Continuing with baseline measurement for {engine}")
-                end_time = int(datetime.now().timestamp() * 1000)
-                baseline_duration = end_time - start_time
-                time.sleep(1)
+                handle_startpage(driver, "angular route uib tab")
 
-        else:
-            accept_cookie(driver, engine)
-            log_message(f"Continuing with baseline measurement for {engine}")
-            end_time = int(datetime.now().timestamp() * 1000)
-            baseline_duration = end_time - start_time
-            time.sleep(1)
+                # Accept cookie to include its overhead in the baseline
+                if engine == "Yahoo":
+                    if not accept_cookie(driver, engine):
+                        log_message(f"Could not accept cookies for {engine}; proceeding without")
+                        log_message("Defaulting to predefined baseline for Yahoo (21676 ms)")
+                        baseline_duration = 21676
+                    else:
+                        log_message(f"Continuing with baseline measurement for {engine}")
+                        end_time = int(datetime.now().timestamp() * 1000)
+                        baseline_duration = end_time - start_time
+                        time.sleep(1)
+
+                else:
+                    accept_cookie(driver, engine)
+                    log_message(f"Continuing with baseline measurement for {engine}")
+                    end_time = int(datetime.now().timestamp() * 1000)
+                    baseline_duration = end_time - start_time
+                    time.sleep(1)
+        except WebDriverException as e:
+            # The pool replaces the failed driver for the next iteration
+            log_message(f"Baseline iteration for {engine} failed: {e}")
+            continue
 
         log_message(f"Baseline for {engine}: {baseline_duration} ms")
         if baseline_duration > 40000:
             # Skip abnormally large durations
             continue
         baseline_durations.append(baseline_duration)
-        driver.quit()
+        count("iterations")
 
-    average_baseline = sum(baseline_durations) / len(baseline_durations)
-    log_message(f"Average baseline for {engine}: {average_baseline} ms")
+    return baseline_durations
 
-    return average_baseline
+
+def measure_all_baselines(engines, iterations, workers=BASELINE_WORKERS, pool=None):
+    """
+    Baseline durations per engine, in the order of `engines`.
+
+    Up to `workers` engines are measured at the same time, each in its own
+    thread with its own driver from a pool of `workers` drivers (`pool` if
+    given). The baseline is a wall-clock duration, so concurrent engines only
+    compete for CPU while their pages load.
+    """
+    if pool is None:
+        with new_driver_pool(workers) as pool:
+            return measure_all_baselines(engines, iterations, workers, pool)
+
+    def measure_engine(item):
+        engine, url = item
+        with span(f"baseline {engine}"):
+            return measure_baseline_durations(engine, url, iterations, pool)
+
+    if workers <= 1:
+        return {engine: measure_engine((engine, url)) for engine, url in engines.items()}
+    log_message(f"Measuring baselines of {workers} engines at a time.")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(engines, executor.map(measure_engine, engines.items())))
+
+
+def refresh_baselines(engines, iterations):
+    """
+    Baseline durations per engine, reusing the stored runs that are still valid.
+
+    An engine's stored runs are valid if they have the current host, Chrome
+    and chromedriver versions and are less than BASELINE_MAX_AGE_DAYS old.
+    Engines with a valid run reuse the latest one, even if a newer run from
+    another environment is stored; the others are measured and their runs
+    appended to the baseline store.
+    """
+    with new_driver_pool(BASELINE_WORKERS) as pool:
+        with pool.session() as driver:
+            environment = driver_environment(driver)
+        log_message(f"Baseline environment: {environment}")
+        reused = reusable_baselines(load_store(), engines, environment)
+        if reused:
+            log_message(f"Reusing baselines measured in the last {BASELINE_MAX_AGE_DAYS:g} days for: {', '.join(reused)}")
+        measured_at = datetime.now()
+        measured = measure_all_baselines({engine: url for engine, url in engines.items() if engine not in reused},
+                                         iterations, pool=pool)
+    append_runs(measured, environment, measured_at)
+    if measured:
+        log_message(f"Baseline iterations added to {BASELINE_STORE_FILE}")
+    return {engine: reused[engine] if engine in reused else measured[engine] for engine in engines}
 
 
 def main():
-    engines = {
-    "Google": "https://www.google.com", 
-    "Bing": "https://www.bing.com",
-    "Yahoo": "https://www.yahoo.com", 
-    "DuckDuckGo": "https://www.duckduckgo.com",
-    "Brave Search": "https://search.brave.com",
-    "Ecosia": "https://www.ecosia.org",
-    "OceanHero": "https://oceanhero.today",
-    "Startpage": "https://www.startpage.com",
-    "Qwant": "https://www.qwant.com",
-    "Swisscows": "https://www.swisscows.com",
-    "Mojeek": "https://www.mojeek.com",
-    "You.com": "https://you.com",
-    }
+    engines = SEARCH_ENGINES
     
     # 1) Gather results in a list of dicts
     results = []
-    for engine, url in engines.items():
-        avg_baseline = measure_baseline(engine, url, iterations=30)
+    previous = load_baseline_overhead()
+    for engine, durations in refresh_baselines(engines, iterations=30).items():
+        if not durations:
+            # Every iteration failed or was too long: keep the engine's previous baseline, if any
+            if engine in previous:
+                log_message(f"Warning: no usable baseline iterations for {engine}; keeping {previous[engine]} ms")
+                results.append({"Search Engine": engine, "Baseline Duration (ms)": previous[engine]})
+            else:
+                log_message(f"Warning: no usable baseline iterations for {engine}; skipping it")
+            continue
+        avg_baseline = sum(durations) / len(durations)
+        log_message(f"Average baseline for {engine}: {avg_baseline} ms")
         results.append({
             "Search Engine": engine,
             "Baseline Duration (ms)": avg_baseline
         })
-    
-    output_file = 'baseline_average.csv'
+
+    output_file = BASELINE_FILE
     
     # 3) Save as CSV using pandas
     try:
@@ -0,0 +1,107 @@
+"""
+Persistent store of per-iteration baseline measurements.
+
+Every baseline run appends one row per iteration to BASELINE_STORE_FILE, with
+the host, the Chrome and chromedriver versions and the measurement method it
+ran with and when it was measured. baseline_measurement reuses an engine's latest run while it comes
+from the same environment and is less than BASELINE_MAX_AGE_DAYS old, and
+process_energy can take the median or a percentile of its durations instead
+of scaling the average recorded with each query.
+"""
+import os
+import platform
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from config import BASELINE_STORE_FILE
+
+BASELINE_MAX_AGE_DAYS = float(os.getenv("BASELINE_MAX_AGE_DAYS", 7))  # Older baselines are measured again
+# What a baseline duration covers; change it when baseline_measurement times something else. Runs
+# from before it was recorded (Chrome launched in every iteration) have no method and are not reused.
+BASELINE_METHOD = "warm-driver-context"
+ENVIRONMENT_COLUMNS = ["Host", "Chrome Version", "Chromedriver Version", "Baseline Method"]
+STORE_COLUMNS = ["Search Engine", "Iteration", "Baseline Duration (ms)", *ENVIRONMENT_COLUMNS, "Measured At"]
+
+
+def driver_environment(driver):
+    """Host, Chrome/chromedriver versions of a running driver and BASELINE_METHOD, keyed by ENVIRONMENT_COLUMNS."""
+    capabilities = driver.capabilities
+    return {
+        "Host": platform.node(),
+        "Chrome Version": capabilities.get("browserVersion", ""),
+        # e.g. "121.0.6167.85 (3f98d690ad7e59242ef110144c757b2ac4eef1a2-refs/branch-heads/6167@{#1539})"
+        "Chromedriver Version": capabilities.get("chrome", {}).get("chromedriverVersion", "").split(" ")[0],
+        "Baseline Method": BASELINE_METHOD,
+    }
+
+
+def load_store(store_file=BASELINE_STORE_FILE):
+    """Every stored baseline iteration with STORE_COLUMNS; columns missing from older stores are empty."""
+    if os.path.exists(store_file):
+        store = pd.read_csv(store_file, sep=";", dtype={column: str for column in ENVIRONMENT_COLUMNS})
+        store = store.reindex(columns=STORE_COLUMNS)
+    else:
+        store = pd.DataFrame(columns=STORE_COLUMNS)
+    store[ENVIRONMENT_COLUMNS] = store[ENVIRONMENT_COLUMNS].fillna("")
+    store["Measured At"] = pd.to_datetime(store["Measured At"])
+    return store
+
+
+def append_runs(durations, environment, measured_at, store_file=BASELINE_STORE_FILE):
+    """Append the iterations of one run, {engine: durations (ms)}, measured in `environment` at measured_at."""
+    rows = [{"Search Engine": engine, "Iteration": i + 1, "Baseline Duration (ms)": duration, **environment,
+             "Measured At": measured_at.isoformat(timespec="seconds")}
+            for engine, engine_durations in durations.items() for i, duration in enumerate(engine_durations)]
+    if not rows:
+        return
+    os.makedirs(os.path.dirname(store_file) or ".", exist_ok=True)
+    runs = pd.DataFrame(rows, columns=STORE_COLUMNS)
+    if os.path.exists(store_file) and list(pd.read_csv(store_file, sep=";", nrows=0).columns) != STORE_COLUMNS:
+        # Written with other columns: rewrite the whole store with STORE_COLUMNS
+        store = load_store(store_file)
+        store["Measured At"] = store["Measured At"].map(lambda t: t.isoformat(timespec="seconds"))
+        pd.concat([store, runs]).to_csv(store_file, index=False, sep=";")
+        return
+    runs.to_csv(store_file, mode="a", header=not os.path.exists(store_file), index=False, sep=";")
+
+
+def latest_runs(store):
+    """The rows of each engine's most recent run."""
+    latest = store.groupby("Search Engine")["Measured At"].transform("max")
+    return store[store["Measured At"] == latest]
+
+
+def reusable_baselines(store, engines, environment, max_age_days=BASELINE_MAX_AGE_DAYS, now=None):
+    """
+    {engine: durations (ms)} of the latest run of each of `engines` that is still valid.
+
+    A run is valid if it was measured in `environment` less than max_age_days
+    before `now`. Engines without a valid run are left out.
+    """
+    now = now or datetime.now()
+    valid = store["Search Engine"].isin(list(engines)) & (store["Measured At"] >= now - timedelta(days=max_age_days))
+    for column in ENVIRONMENT_COLUMNS:
+        valid &= store[column] == environment[column]
+    runs = latest_runs(store[valid])
+    return {engine: group["Baseline Duration (ms)"].tolist() for engine, group in runs.groupby("Search Engine")}
+
+
+def baseline_statistic(store, statistic):
+    """
+    {engine: baseline (ms)} from the durations of each engine's latest run measured with BASELINE_METHOD.
+
+    `statistic` is "mean", "median" or "p<q>" for the q-th percentile, e.g. "p25".
+    """
+    durations = latest_runs(store[store["Baseline Method"] == BASELINE_METHOD]).groupby("Search Engine")["Baseline Duration (ms)"]
+    if statistic == "mean":
+        return durations.mean().to_dict()
+    if statistic == "median":
+        return durations.median().to_dict()
+    try:
+        q = float(statistic[1:]) if statistic.startswith("p") else None
+    except ValueError:
+        q = None
+    if q is None or not 0 <= q <= 100:
+        raise ValueError(f"Unknown baseline statistic {statistic!r}: use mean, median or p<0-100>.")
+    return durations.quantile(q / 100).to_dict()
@@ -0,0 +1,98 @@
+"""
+Shared configuration for the measurement, analysis and plotting scripts.
+
+Importing this module is cheap and has no side effects: it only imports the
+standard library. Heavy libraries (scipy, matplotlib, seaborn, selenium) are
+loaded with `lazy_import`, which defers the actual import to the first
+attribute access, and baseline_average.csv is only read on demand.
+"""
+import importlib.util
+import os
+import sys
+from functools import lru_cache
+
+# Search Engines
+SEARCH_ENGINES = {
+    "Google": "https://www.google.com",
+    "Bing": "https://www.bing.com",
+    "Yahoo": "https://www.yahoo.com",
+    "DuckDuckGo": "https://www.duckduckgo.com",
+    "Brave Search": "https://search.brave.com",
+    "Ecosia": "https://www.ecosia.org",
+    "OceanHero": "https://oceanhero.today",
+    "Startpage": "https://www.startpage.com",
+    "Qwant": "https://www.qwant.com",
+    "Swisscows": "https://www.swisscows.com",
+    "Mojeek": "https://www.mojeek.com",
+    "You.com": "https://you.com",
+}
+
+SEARCH_QUERIES = [
+    "angular route uib tab",
+    # "react setstate sub property",
+    # "bootstrap button next to input",
+    # "forcelayout api",
+    # "golang copy built in",
+    # "strlen",
+    # "java comparator interface",
+    # "ubuntu search packages",
+    # "URI uri = new URIBuilder",
+    # "java throw exception example",
+    # "mdn transform origin",
+    # "segmented circle css",
+    # "show is not a member of org.apache.spark.sql.GroupedData",
+    # "babel-jest can't console log in babel jest",
+    # "json minify"
+]
+
+DEFAULT_DURATION = 60 #60 # Search test duration in seconds
+DEFAULT_WARMUP = 300 #300  # Warmup duration in seconds (should be 300 for real tests)
+ITERATIONS = 30 #30  # Number of test iterations
+
+# File paths, relative to the energy_consumption directory
+BASELINE_FILE = "baseline_average.csv"
+BASELINE_STORE_FILE = "results/baseline_store.csv"  # Every baseline iteration, see baseline_store.py
+TIMESTAMPS_FILE = "search_engine_results/search_engine_timestamps.csv"
+ENERGY_LOG_FILE = "energy_log.csv"
+RESULTS_DIR = "results"
+FINAL_ENERGY_FILE = "results/final_energy_results.csv"
+SAMPLE_FILE = "results/final_energy_samples.csv"
+TIME_BINS_FILE = "results/time_binned_samples.csv"
+PAIRWISE_RESULTS_FILE = "results/pairwise_comparisons.csv"
+STAT_TEST_FILE = "results/statistical_tests.csv"
+RESAMPLING_FILE = "results/resampling_comparisons.csv"
+PLOTS_DIR = "results/plots"
+PROFILE_FILE = "results/pipeline_profile.json"
+
+
+def lazy_import(name):
+    """
+    Module `name`, imported on first attribute access.
+
+    Returns the module itself if it is already imported. Raises
+    ModuleNotFoundError right away if it is not installed.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+@lru_cache(maxsize=None)
+def load_baseline_overhead(baseline_file=BASELINE_FILE):
+    """Baseline Selenium overhead (ms) per search engine from baseline_average.csv, or {} if it is missing."""
+    if not os.path.exists(baseline_file):
+        return {}
+    import pandas as pd
+    baseline_df = pd.read_csv(baseline_file, sep=";")
+    return baseline_df.set_index("Search Engine")["Baseline Duration (ms)"].to_dict()
@@ -0,0 +1,96 @@
+"""
+Largest-Triangle-Three-Buckets (LTTB) downsampling of line plots.
+
+LTTB keeps the first and last point and picks, in each of n_out - 2 equal
+buckets, the point forming the largest triangle with the point picked in the
+previous bucket and the average of the next bucket, so peaks and dips survive.
+Very long series are first reduced to the minimum and maximum of small
+chunks (MinMaxLTTB), which is fully vectorized; the global maximum is always
+kept so power spikes stay visible.
+"""
+import numpy as np
+
+MINMAX_RATIO = 4  # Preselected min/max points per output point for long series
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the n_out points LTTB keeps from the series (x, y); x must be sorted.
+
+    Each bucket is scored against the point picked in the previous bucket, so
+    the buckets are visited in order; the areas within a bucket are vectorized.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    inner_x, inner_y = x[1:-1], y[1:-1]
+    bounds = np.linspace(0, n - 2, n_out - 1).astype(np.int64)
+    starts, stops = bounds[:-1], bounds[1:]
+    sizes = stops - starts
+    # The third triangle corner of each bucket: the average of the next bucket, or the last point
+    avg_x = np.add.reduceat(inner_x, starts) / sizes
+    avg_y = np.add.reduceat(inner_y, starts) / sizes
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    ax, ay = x[0], y[0]
+    for i in range(n_out - 2):
+        bx, by = inner_x[starts[i]:stops[i]], inner_y[starts[i]:stops[i]]
+        area = np.abs((ax - next_x[i]) * (by - ay) - (ax - bx) * (next_y[i] - ay))
+        j = starts[i] + int(np.argmax(area))
+        selected[i + 1] = j + 1
+        ax, ay = inner_x[j], inner_y[j]
+    return selected
+
+
+def minmax_indices(y, n_chunks):
+    """Indices of the first, last, minimum and maximum point of n_chunks equal chunks of y."""
+    n = len(y)
+    size = n // n_chunks
+    if size < 2:
+        return np.arange(n)
+    body = y[:size * n_chunks].reshape(n_chunks, size)
+    offsets = np.arange(n_chunks) * size
+    indices = [offsets + body.argmin(axis=1), offsets + body.argmax(axis=1), [0, n - 1]]
+    if size * n_chunks < n:
+        tail = y[size * n_chunks:]
+        indices.append([size * n_chunks + tail.argmin(), size * n_chunks + tail.argmax()])
+    return np.unique(np.concatenate(indices))
+
+
+def downsample_indices(x, y, n_out):
+    """
+    Sorted indices of about n_out points of (x, y) to draw instead of the full series.
+
+    NaN values of y are skipped. Returns all indices if the series is short.
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= n_out:
+        return valid
+    vx, vy = x[valid], y[valid]
+    candidates = np.arange(len(valid))
+    if len(valid) > MINMAX_RATIO * n_out:
+        candidates = minmax_indices(vy, MINMAX_RATIO * n_out // 2)
+    keep = candidates[lttb_indices(vx[candidates], vy[candidates], n_out)]
+    keep = np.union1d(keep, [np.argmax(vy)])
+    return valid[keep]
+
+
+def downsample_frame(df, x, y, by, n_out):
+    """
+    Rows of df kept when each `by` group's (x, y) line is downsampled to about n_out points.
+
+    `by` is a column name or a list of them, e.g. engine and iteration for one
+    line per measurement.
+    """
+    if n_out <= 0 or df.empty:
+        return df
+    by = [by] if isinstance(by, str) else list(by)
+    df = df.sort_values([*by, x], kind="stable")
+    xs, ys = df[x].to_numpy(), df[y].to_numpy()
+    positions = [rows[downsample_indices(xs[rows], ys[rows], n_out)]
+                 for rows in df.groupby(by, sort=False).indices.values()]
+    return df.iloc[np.sort(np.concatenate(positions))]
@@ -0,0 +1,167 @@
+"""
+Pool of warm Chrome drivers that gives every use a fresh browser context.
+
+Starting Chrome and chromedriver takes seconds, far longer than most of what
+baseline_measurement times. The pool keeps its drivers running between uses;
+`session()` opens a new browser context (CDP Target.createBrowserContext, the
+same isolation as an incognito window) in one of them, switches the driver to
+a tab in it and disposes of the context afterwards, so every use starts with
+an empty cache, no cookies and no storage. If the browser cannot create
+contexts, its cache, cookies and the visited origin's storage are wiped
+instead. A driver that fails during a session, or has served `max_uses`
+sessions, is quit and replaced by a new one on a later use.
+"""
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import WebDriverException
+
+from instrumentation import count, log_message, span
+
+DRIVER_MAX_USES = int(os.getenv("DRIVER_MAX_USES", 50))  # Sessions before a driver is replaced
+
+
+def _quit(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        log_message(f"Error quitting driver: {e}")
+
+
+def open_context(driver, init_script=None):
+    """
+    Switch driver to a blank tab in a new browser context.
+
+    Returns (context id, previous window handle), or None if the browser does
+    not support browser contexts. `init_script` is run in every document of
+    the new tab before the page's own scripts.
+    """
+    home = driver.current_window_handle
+    handles = set(driver.window_handles)
+    try:
+        context = driver.execute_cdp_cmd("Target.createBrowserContext", {})["browserContextId"]
+    except WebDriverException as e:
+        log_message(f"Browser contexts not available, wiping storage between sessions instead: {e}")
+        return None
+    target = driver.execute_cdp_cmd("Target.createTarget", {"url": "about:blank", "browserContextId": context})["targetId"]
+    # chromedriver uses the target id as window handle; fall back to the handle that is new
+    new_handles = set(driver.window_handles) - handles
+    driver.switch_to.window(target if target in new_handles or not new_handles else new_handles.pop())
+    if init_script:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": init_script})
+    return context, home
+
+
+def close_context(driver, context, home):
+    """Close the tab of a context from open_context, dispose of the context and switch back to `home`."""
+    driver.close()
+    driver.switch_to.window(home)
+    driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": context})
+
+
+def wipe_storage(driver):
+    """Clear the browser cache and cookies and the current origin's storage, and go to a blank page."""
+    parts = urlsplit(driver.current_url)
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    if parts.scheme in ("http", "https"):
+        driver.execute_cdp_cmd("Storage.clearDataForOrigin",
+                               {"origin": f"{parts.scheme}://{parts.netloc}", "storageTypes": "all"})
+    driver.get("about:blank")
+
+
+class DriverPool:
+    """
+    Up to `size` drivers made by `setup`, shared by threads.
+
+    Use as a context manager, or call close() when done, so the drivers are
+    quit. `setup` returns a new driver or None if it could not start one.
+    """
+
+    def __init__(self, setup, size=1, max_uses=DRIVER_MAX_USES, init_script=None):
+        self.setup = setup
+        self.size = size
+        self.max_uses = max_uses
+        self.init_script = init_script
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            with span("driver setup"):
+                driver = self.setup()
+        except BaseException:
+            self._slots.release()
+            raise
+        if driver is None:
+            self._slots.release()
+            raise RuntimeError("Failed to start a Chrome driver.")
+        count("driver_launches")
+        return driver
+
+    def _release(self, driver, healthy):
+        with self._lock:
+            uses = self._uses.pop(id(driver), 0) + 1
+            keep = healthy and uses < self.max_uses and not self._closed
+            if keep:
+                self._uses[id(driver)] = uses
+                self._idle.put(driver)
+        if not keep:
+            if not healthy:
+                log_message("Replacing a driver that failed during a session.")
+            _quit(driver)
+        self._slots.release()
+
+    @contextmanager
+    def session(self):
+        """
+        A driver switched to a fresh browser context for the duration of the block.
+
+        Blocks while all `size` drivers are in use. The driver is recycled if
+        the block raises or the context cannot be cleaned up.
+        """
+        driver = self._acquire()
+        healthy = False
+        context = None
+        try:
+            context = open_context(driver, self.init_script)
+            yield driver
+            healthy = True
+        finally:
+            try:
+                if context:
+                    close_context(driver, *context)
+                else:
+                    wipe_storage(driver)
+            except Exception as e:
+                log_message(f"Error cleaning up browser session: {e}")
+                healthy = False
+            self._release(driver, healthy)
+
+    def close(self):
+        """Quit the idle drivers; drivers still in a session are quit when it ends."""
+        with self._lock:
+            self._closed = True
+            self._uses.clear()
+        while True:
+            try:
+                _quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
@@ -0,0 +1,142 @@
+"""
+Binary columnar cache for parsed CSV files.
+
+Each CSV is parsed once and stored as one .npy file per column, keyed by the
+source file's size, mtime and content hash. The cache directory also depends
+on the source of the loader's module, so changing a loader (e.g. the declared
+EnergiBridge schema) starts a new cache. Later loads memory-map the cached
+columns instead of re-parsing the CSV. Set CSV_CACHE=0 to bypass the cache.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count, log_message, span
+
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+USE_CACHE = os.getenv("CSV_CACHE", "1") != "0"
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_hash(path):
+    """Content hash of a file, read in blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def module_hash(module_name):
+    """Content hash of a module's source file, or "" if it has none."""
+    path = getattr(sys.modules.get(module_name), "__file__", None)
+    return file_hash(path) if path and os.path.exists(path) else ""
+
+
+def _source_state(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def cache_path_for(path, loader=pd.read_csv, **kwargs):
+    """Cache directory for `path` loaded with `loader(path, **kwargs)`."""
+    spec = (f"{os.path.abspath(path)}|{loader.__module__}.{loader.__qualname__}|{module_hash(loader.__module__)}"
+            f"|{sorted(kwargs.items())!r}")
+    name = f"{os.path.basename(path)}-{hashlib.blake2b(spec.encode(), digest_size=8).hexdigest()}"
+    return os.path.join(CACHE_DIR, name)
+
+
+def _write_cache(df, cache_path, source):
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.makedirs(cache_path)
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        categories = None
+        if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+            values = series.to_numpy()
+        else:
+            # Strings and mixed objects are stored as integer codes (-1 = missing)
+            values, uniques = pd.factorize(series)
+            values = values.astype(np.int32)
+            categories = [v.item() if isinstance(v, np.generic) else v for v in uniques]
+        np.save(os.path.join(cache_path, f"{i}.npy"), values, allow_pickle=False)
+        columns.append({"name": name, "dtype": str(series.dtype), "categories": categories})
+
+    meta = dict(source, columns=columns, attrs=dict(df.attrs))
+    # meta.json is written last, so a partially written cache is never read
+    with open(os.path.join(cache_path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def _read_cache(cache_path, meta):
+    data = {}
+    for i, column in enumerate(meta["columns"]):
+        values = np.load(os.path.join(cache_path, f"{i}.npy"), mmap_mode="r")
+        if column["categories"] is not None:
+            lookup = np.array(column["categories"] + [np.nan], dtype=object)
+            values = pd.array(lookup[values], dtype=column["dtype"])
+        data[column["name"]] = values
+    df = pd.DataFrame(data, copy=False)
+    df.attrs.update(meta["attrs"])
+    return df
+
+
+def cached_load(path, loader=pd.read_csv, **kwargs):
+    """
+    Load `path` with `loader(path, **kwargs)` through the columnar cache.
+
+    The cache is reused while the source keeps its size and either its mtime
+    or its content hash; otherwise the file is parsed again and re-cached.
+    """
+    if not USE_CACHE:
+        return loader(path, **kwargs)
+
+    cache_path = cache_path_for(path, loader, **kwargs)
+    meta_file = os.path.join(cache_path, "meta.json")
+    state = _source_state(path)
+    try:
+        with open(meta_file) as f:
+            meta = json.load(f)
+        if meta["size"] == state["size"]:
+            if meta["mtime_ns"] != state["mtime_ns"] and meta["hash"] == file_hash(path):
+                # Touched but unchanged: remember the new mtime to skip rehashing
+                meta["mtime_ns"] = state["mtime_ns"]
+                with open(meta_file, "w") as f:
+                    json.dump(meta, f)
+            if meta["mtime_ns"] == state["mtime_ns"]:
+                count("cache_hits")
+                return _read_cache(cache_path, meta)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    with span(f"parse {path}") as parse:
+        df = loader(path, **kwargs)
+        parse.counters["rows"] = len(df)
+    try:
+        _write_cache(df, cache_path, dict(state, hash=file_hash(path)))
+    except (OSError, ValueError, TypeError) as e:
+        log_message(f"Could not cache {path}: {e}")
+    return df
+
+
+def store_cached(df, path, loader=pd.read_csv, **kwargs):
+    """
+    Store `df` as the cache entry of `path` loaded with `loader(path, **kwargs)`.
+
+    Call right after writing df to `path`, so the next cached_load reads the
+    typed columns instead of parsing the file.
+    """
+    if not USE_CACHE:
+        return
+    try:
+        _write_cache(df, cache_path_for(path, loader, **kwargs), dict(_source_state(path), hash=file_hash(path)))
+    except (OSError, ValueError, TypeError) as e:
+        log_message(f"Could not cache {path}: {e}")
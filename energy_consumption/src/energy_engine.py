@@ -0,0 +1,271 @@
+"""
+Columnar energy engine.
+
+Turns the raw EnergiBridge columns of a measurement window into per-sample
+power, total energy, average power and temperature with a handful of NumPy
+array operations instead of a per-sample Python loop.
+"""
+import os
+
+import numpy as np
+
+# Energy/power columns in order of preference when several are logged.
+# Power columns are integrated over time, energy counters are differenced.
+ENERGY_KEYS = ["SYSTEM_POWER (Watts)", "PACKAGE_ENERGY (J)", "CPU_ENERGY (J)", "CPU_POWER (Watts)"]
+COUNTER_KEYS = {"PACKAGE_ENERGY (J)", "CPU_ENERGY (J)"}
+POWER_KEYS = {"SYSTEM_POWER (Watts)", "CPU_POWER (Watts)"}
+
+# Value at which the cumulative energy counter wraps back to zero. When unknown
+# (0) a decreasing counter is assumed to have restarted from zero.
+COUNTER_WRAP_J = float(os.getenv("COUNTER_WRAP_J", 0))
+
+
+def detect_energy_key(columns):
+    """Return the preferred energy/power column present in `columns`."""
+    for key in ENERGY_KEYS:
+        if key in columns:
+            return key
+    raise KeyError(f"No energy or power column found, expected one of {ENERGY_KEYS}")
+
+
+def energy_key(frame):
+    """Energy/power column of `frame`, as recorded by the loader or detected."""
+    return frame.attrs.get("energy_key") or detect_energy_key(frame.columns)
+
+
+def temperature_columns(columns):
+    """Return the CPU_TEMP_* columns present in `columns`."""
+    return [col for col in columns if col.startswith("CPU_TEMP")]
+
+
+def _ffill(values):
+    """Forward-fill NaNs in a 1-D array (leading NaNs are kept)."""
+    mask = np.isnan(values)
+    if not mask.any():
+        return values
+    idx = np.where(mask, 0, np.arange(len(values)))
+    np.maximum.accumulate(idx, out=idx)
+    return values[idx]
+
+
+def _counter_deltas(values, previous=np.nan):
+    """
+    Difference a cumulative energy counter, correcting for wraparound.
+
+    `previous` is the reading preceding values[0] (NaN if there is none).
+    """
+    deltas = np.diff(values, prepend=previous)
+    wrapped = deltas < 0
+    if wrapped.any():
+        if COUNTER_WRAP_J > 0:
+            deltas[wrapped] += COUNTER_WRAP_J
+        else:
+            deltas[wrapped] = values[wrapped]
+    return deltas
+
+
+def derive_power(values, delta, times, key, previous=None):
+    """
+    Derive per-sample power and segment energy for one energy/power column.
+
+    Args:
+      - values: readings of `key` (J for counters, W for power columns).
+      - delta: EnergiBridge "Delta" column, ms since the previous sample.
+      - times: "Time" column in ms.
+      - previous: optional (value, time) of the sample preceding values[0],
+        used to continue a series across chunk boundaries.
+
+    Returns:
+      - power: power (W) per sample. For counters the first sample has no
+        predecessor and is NaN; samples with a zero or NaN Delta get 0 W.
+      - segments: energy (J) of the segment ending at each sample, 0 for the
+        first sample. Summing segments[1:] gives the window's total energy.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    prev_value, prev_time = previous if previous is not None else (np.nan, np.nan)
+
+    if key in COUNTER_KEYS:
+        delta = np.asarray(delta, dtype=np.float64)
+        delta_e = _counter_deltas(values, prev_value)
+        valid = ~np.isnan(delta) & (delta > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            power = np.where(valid, delta_e * 1000 / delta, 0.0)
+        if previous is None:
+            power[:1] = np.nan
+        # Energy ignores missing readings instead of poisoning the sum, so
+        # it equals the last minus the first valid counter reading.
+        segments = np.nan_to_num(_counter_deltas(_ffill(values), prev_value))
+        return power, segments
+
+    power = values
+    segments = np.diff(times, prepend=prev_time) / 1000.0 * (values + np.append(prev_value, values[:-1])) / 2
+    if previous is None:
+        segments[:1] = 0.0
+    return power, segments
+
+
+def nanmean(values, axis=None):
+    """Mean ignoring NaNs that returns NaN (without warning) for empty input."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=axis)
+    total = np.where(valid, values, 0.0).sum(axis=axis)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return total / np.where(count > 0, count, np.nan)
+
+
+def interval_metrics(frame, key=None):
+    """
+    Compute the energy metrics of one window in a few array operations.
+
+    Returns (total_energy, avg_power, avg_temp, power, key). avg_temp is only
+    computed for power-column logs, where EnergiBridge reports temperatures.
+    """
+    key = key or energy_key(frame)
+    power, segments = derive_power(frame[key].to_numpy(), frame["Delta"].to_numpy(),
+                                   frame["Time"].to_numpy(), key)
+    total_energy = segments[1:].sum() if len(segments) > 1 else 0.0
+    avg_power = float(nanmean(power))
+
+    avg_temp = None
+    temp_cols = temperature_columns(frame.columns)
+    if key in POWER_KEYS and temp_cols:
+        avg_temp = float(nanmean(nanmean(frame[temp_cols].to_numpy(dtype=np.float64), axis=0)))
+    return total_energy, avg_power, avg_temp, power, key
+
+
+def _prefix_sums(values):
+    """Cumulative sums of the non-NaN values and of their counts, with a leading 0 row."""
+    valid = ~np.isnan(values)
+    zeros = np.zeros((1,) + values.shape[1:])
+    cum = np.concatenate([zeros, np.cumsum(np.where(valid, values, 0.0), axis=0)])
+    cum_n = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+    return cum, cum_n
+
+
+def empty_sums(n_windows, n_temps):
+    """Zero window sums (see EnergyIndex.range_sums) to accumulate into."""
+    return {
+        "samples": np.zeros(n_windows, dtype=np.int64),
+        "energy": np.zeros(n_windows),
+        "energy_nan": np.zeros(n_windows),
+        "span": np.zeros(n_windows),
+        "power": np.zeros(n_windows),
+        "power_n": np.zeros(n_windows),
+        "temp": np.zeros((n_windows, n_temps)),
+        "temp_n": np.zeros((n_windows, n_temps)),
+    }
+
+
+def finalize_sums(sums):
+    """
+    Turn additive window sums (see EnergyIndex.range_sums) into window metrics.
+
+    Returns a dict of arrays: "Total Energy (J)", "Average Power (W)",
+    "Temperature" (None when the log has no temperatures), "Samples" and
+    "Span (s)", the time the energy is integrated over.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        energy = np.where(sums["energy_nan"] > 0, np.nan, sums["energy"])
+        avg_power = sums["power"] / np.where(sums["power_n"] > 0, sums["power_n"], np.nan)
+        avg_temp = None
+        if sums["temp"].shape[1]:
+            col_means = sums["temp"] / np.where(sums["temp_n"] > 0, sums["temp_n"], np.nan)
+            avg_temp = nanmean(col_means, axis=1)
+    return {"Total Energy (J)": energy, "Average Power (W)": avg_power,
+            "Temperature": avg_temp, "Samples": sums["samples"], "Span (s)": sums["span"]}
+
+
+class EnergyIndex:
+    """
+    Prefix-sum index over an energy log.
+
+    The log is sorted by time once; cumulative segment energy (trapezoids for
+    power columns, counter deltas for energy counters), power and temperature
+    sums then let any [start, end] window resolve with two binary searches.
+
+    `previous` is the (value, time) of the sample preceding the log, used when
+    indexing one chunk of a longer log.
+    """
+
+    def __init__(self, energy_df, key=None, previous=None):
+        self.frame = energy_df.sort_values("Time", kind="stable").reset_index(drop=True)
+        self.key = key or energy_key(self.frame)
+        self.is_counter = self.key in COUNTER_KEYS
+        self.times = self.frame["Time"].to_numpy(dtype=np.int64)
+        self.power, segments = derive_power(self.frame[self.key].to_numpy(), self.frame["Delta"].to_numpy(),
+                                            self.times, self.key, previous)
+        self.temp_columns = temperature_columns(self.frame.columns) if self.key in POWER_KEYS else []
+        temps = self.frame[self.temp_columns].to_numpy(dtype=np.float64).reshape(len(self.frame), -1)
+
+        self._segments, self._segments_n = _prefix_sums(segments)
+        # Length (s) of the segment ending at each sample, as integrated into `segments`
+        previous_time = previous[1] if previous is not None else np.nan
+        self._span = _prefix_sums(np.diff(self.times, prepend=previous_time) / 1000.0)[0]
+        self._power, self._power_n = _prefix_sums(self.power)
+        self._temp, self._temp_n = _prefix_sums(temps)
+
+    def __len__(self):
+        return len(self.times)
+
+    def locate(self, starts, ends):
+        """Row range [lo, hi) of the samples with start <= Time <= end, per window."""
+        lo = np.searchsorted(self.times, np.asarray(starts, dtype=np.int64), side="left")
+        hi = np.searchsorted(self.times, np.asarray(ends, dtype=np.int64), side="right")
+        return lo, np.maximum(hi, lo)
+
+    def range_sums(self, lo, hi, started=False):
+        """
+        Additive sums over the rows [lo, hi) of each window.
+
+        `started` marks windows that already contain the row before `lo`, so
+        the segment (and counter power) ending at `lo` belongs to them. Sums
+        of consecutive row ranges can be added before `finalize_sums`.
+        """
+        lo, hi = np.asarray(lo), np.asarray(hi)
+        inner = np.minimum(np.where(started, lo, lo + 1), hi)
+        power_lo = inner if self.is_counter else lo
+        return {
+            "samples": hi - lo,
+            "energy": self._segments[hi] - self._segments[inner],
+            "energy_nan": (hi - inner) - (self._segments_n[hi] - self._segments_n[inner]),
+            "span": self._span[hi] - self._span[inner],
+            "power": self._power[hi] - self._power[power_lo],
+            "power_n": self._power_n[hi] - self._power_n[power_lo],
+            "temp": self._temp[hi] - self._temp[lo],
+            "temp_n": self._temp_n[hi] - self._temp_n[lo],
+        }
+
+    def query(self, starts, ends):
+        """
+        Resolve many [start, end] windows (ms) in one batched call.
+
+        Returns the dict of `finalize_sums` plus the row ranges "lo"/"hi".
+        """
+        lo, hi = self.locate(starts, ends)
+        metrics = finalize_sums(self.range_sums(lo, hi))
+        metrics["lo"], metrics["hi"] = lo, hi
+        return metrics
+
+    def window_samples(self, lo, hi, started=False):
+        """
+        Samples of many windows, concatenated in window order without a Python loop.
+
+        Returns the samples, with "Power (W)" derived as in
+        compute_energy_for_interval, and for each sample the position of its
+        window in lo/hi. `started` is as in range_sums.
+        """
+        lo, hi = np.asarray(lo), np.asarray(hi)
+        lengths = hi - lo
+        offsets = np.cumsum(lengths) - lengths
+        windows = np.repeat(np.arange(len(lo)), lengths)
+        rows = np.arange(lengths.sum()) - np.repeat(offsets - lo, lengths)
+
+        samples = self.frame.take(rows).reset_index(drop=True)
+        power = self.power[rows]
+        if self.is_counter:
+            # The first sample of a window has no predecessor inside it
+            power[offsets[(lengths > 0) & ~np.broadcast_to(started, lengths.shape)]] = np.nan
+        samples["Power (W)"] = power
+        return samples, windows
@@ -0,0 +1,132 @@
+"""
+Readers for EnergiBridge logs.
+
+`load_energy_log` parses only the columns the analysis needs, with compact
+dtypes from a declared schema. `stream_windows` reads the log in time-ordered
+chunks and hands each chunk only to the query windows it overlaps, so peak
+memory is bounded by the chunk size rather than by the size of the log.
+"""
+import numpy as np
+import pandas as pd
+
+from energy_engine import (POWER_KEYS, EnergyIndex, detect_energy_key, empty_sums,
+                           finalize_sums, temperature_columns)
+from instrumentation import count
+
+DEFAULT_CHUNKSIZE = 500_000  # rows per chunk
+SAMPLE_COLUMNS = ["USED_MEMORY", "TOTAL_MEMORY"]  # extra columns kept for the sample export
+
+# Declared EnergiBridge schema, matched by column-name prefix. Timestamps stay
+# int64 and energy/power/memory float64; per-core readings fit in float32.
+ENERGIBRIDGE_SCHEMA = [
+    ("Time", "int64"),
+    ("Delta", "float32"),
+    ("CPU_FREQUENCY", "float32"),
+    ("CPU_TEMP", "float32"),
+    ("CPU_USAGE", "float32"),
+]
+DEFAULT_DTYPE = "float64"
+
+
+def schema_dtypes(columns):
+    """Map each column to its dtype in ENERGIBRIDGE_SCHEMA."""
+    dtypes = {}
+    for col in columns:
+        dtypes[col] = next((dtype for prefix, dtype in ENERGIBRIDGE_SCHEMA if col.startswith(prefix)),
+                           DEFAULT_DTYPE)
+    return dtypes
+
+
+def analysis_columns(header, key=None):
+    """Columns of an EnergiBridge log used by the energy analysis, in file order."""
+    key = key or detect_energy_key(header)
+    wanted = {"Delta", "Time", key, *temperature_columns(header), *SAMPLE_COLUMNS}
+    return [col for col in header if col in wanted]
+
+
+def load_energy_log(energy_file, columns=None):
+    """
+    Load an EnergiBridge log with column projection and compact dtypes.
+
+    Only `columns` are parsed (default: analysis_columns). The detected
+    energy/power column is stored in `df.attrs["energy_key"]`.
+    """
+    header = pd.read_csv(energy_file, nrows=0).columns
+    key = detect_energy_key(header)
+    usecols = columns or analysis_columns(header, key)
+    energy_df = pd.read_csv(energy_file, usecols=usecols, dtype=schema_dtypes(usecols))
+    energy_df.attrs["energy_key"] = key
+    return energy_df
+
+
+def stream_windows(energy_file, starts, ends, chunksize=DEFAULT_CHUNKSIZE, key=None, keep_samples=True):
+    """
+    Compute window metrics by streaming the energy log in chunks.
+
+    Args:
+      - energy_file: EnergiBridge CSV, which must be in time order.
+      - starts, ends: window bounds (ms), in any order.
+      - keep_samples: also collect the samples of each window, or of the
+        windows where this boolean array is True.
+
+    Returns:
+      - windows: dict of arrays as returned by energy_engine.finalize_sums,
+        identical to EnergyIndex.query on the fully loaded log.
+      - (samples, sample_windows): the samples of all windows concatenated
+        in window order and the window of each sample, as returned by
+        EnergyIndex.window_samples (empty if keep_samples is False).
+    """
+    header = pd.read_csv(energy_file, nrows=0).columns
+    key = key or detect_energy_key(header)
+    temp_cols = temperature_columns(header)
+    usecols = analysis_columns(header, key)
+
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    n_windows = len(starts)
+    keep = np.broadcast_to(np.asarray(keep_samples, dtype=bool), (n_windows,))
+    n_temps = len(temp_cols) if key in POWER_KEYS else 0
+    order = np.argsort(starts, kind="stable")
+    sorted_starts, sorted_ends = starts[order], ends[order]
+
+    totals = empty_sums(n_windows, n_temps)
+    sample_parts, window_parts = [], []
+
+    previous = None
+    first = 0  # windows before `first` (in start order) ended before the current chunk
+    for chunk in pd.read_csv(energy_file, usecols=usecols, dtype=schema_dtypes(usecols), chunksize=chunksize):
+        times = chunk["Time"].to_numpy(dtype=np.int64)
+        count("rows", len(times))
+        count("chunks")
+        if not chunk["Time"].is_monotonic_increasing or (previous is not None and times[0] < previous[1]):
+            raise ValueError(f"{energy_file} is not in time order; load it in memory instead of streaming")
+        index = EnergyIndex(chunk, key, previous=previous)
+        previous = (chunk[key].iloc[-1], times[-1])
+
+        # Only windows overlapping [first sample, last sample] of this chunk
+        while first < n_windows and sorted_ends[first] < times[0]:
+            first += 1
+        upto = np.searchsorted(sorted_starts, times[-1], side="right")
+        overlapping = np.arange(first, upto)
+        overlapping = order[overlapping[sorted_ends[overlapping] >= times[0]]]
+        if not len(overlapping):
+            continue
+
+        lo, hi = index.locate(starts[overlapping], ends[overlapping])
+        started = totals["samples"][overlapping] > 0
+        for name, value in index.range_sums(lo, hi, started).items():
+            totals[name][overlapping] += value
+
+        kept = keep[overlapping]
+        if kept.any():
+            samples, positions = index.window_samples(lo[kept], hi[kept], started[kept])
+            sample_parts.append(samples)
+            window_parts.append(overlapping[kept][positions])
+
+    if not sample_parts:
+        return finalize_sums(totals), (pd.DataFrame(), np.empty(0, dtype=np.int64))
+    # Chunks arrive in time order, so a stable sort by window keeps each window's samples in order
+    sample_windows = np.concatenate(window_parts)
+    order = np.argsort(sample_windows, kind="stable")
+    samples = pd.concat(sample_parts, ignore_index=True).take(order).reset_index(drop=True)
+    return finalize_sums(totals), (samples, sample_windows[order])
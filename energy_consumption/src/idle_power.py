@@ -0,0 +1,53 @@
+"""
+Idle power from the rest periods between queries.
+
+measure.py waits DEFAULT_DURATION seconds after each query and again at the
+end of every iteration, so the energy log holds a rest period between every
+two consecutive query windows. `rest_periods` finds them from the campaign
+timeline: from the end of one query (plus a settling time for the page to go
+quiet) to the start of the next. The mean power over the rest right before a
+query, or right after it for the first query, estimates the machine's idle
+draw at that time; subtracting it gives the energy the query itself used.
+"""
+import os
+
+import numpy as np
+
+IDLE_SETTLE_MS = int(os.getenv("IDLE_SETTLE_MS", 5000))  # Skipped at the start of a rest period
+IDLE_MIN_REST_MS = int(os.getenv("IDLE_MIN_REST_MS", 10000))  # Shorter rest periods are not used
+REST_COLUMNS = ["Rest Before Start", "Rest Before End", "Rest After Start", "Rest After End"]
+
+
+def rest_periods(starts, query_ends, wait_ms, settle_ms=IDLE_SETTLE_MS, min_rest_ms=IDLE_MIN_REST_MS):
+    """
+    The rest periods (ms) before and after each query window.
+
+    `starts` are the query start times and `query_ends` the times the results
+    were shown (End Time without the wait). Queries are ordered by start time;
+    the rest after the last one is its own wait. Rest periods shorter than
+    min_rest_ms after settling are returned empty (end < start). Returns an
+    (n, 4) int64 array with the columns of REST_COLUMNS.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    query_ends = np.asarray(query_ends, dtype=np.int64)
+    order = np.argsort(starts, kind="stable")
+    after_start = query_ends[order] + settle_ms
+    after_end = np.append(starts[order][1:], query_ends[order][-1:] + wait_ms) if len(order) else after_start
+    after_end = np.where(after_end - after_start >= min_rest_ms, after_end, after_start - 1)
+
+    rests = np.empty((len(starts), 4), dtype=np.int64)
+    rests[order, 2], rests[order, 3] = after_start, after_end
+    # The rest before a query is the rest after the previous one; the first query has none
+    rests[order, 0] = np.append(after_start[:1], after_start[:-1])
+    rests[order, 1] = np.append(after_start[:1] - 1, after_end[:-1])
+    return rests
+
+
+def idle_power(power_before, power_after):
+    """Idle power per window: from the rest before it, or the rest after it if that has no samples."""
+    return np.where(np.isnan(power_before), power_after, power_before)
+
+
+def net_energy(energy, avg_power, span_s, idle):
+    """(net energy J, net average power W) above the idle power `idle` over `span_s` seconds."""
+    return energy - idle * span_s, avg_power - idle
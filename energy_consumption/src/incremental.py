@@ -0,0 +1,149 @@
+"""
+State for incremental re-analysis of a growing measurement campaign.
+
+Per-window results are persisted together with the window key (engine,
+iteration, start time) and the buffer they were computed with, so a later run
+only computes the windows that are new in search_engine_timestamps.csv.
+Per-engine running aggregates (count, mean, M2) are merged with the new
+windows instead of being recomputed. The state also records the settings the
+windows were computed with and a fingerprint of the energy log; it is
+discarded when the settings differ or the log changed other than by
+appending rows.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+WINDOW_STATE_FILE = "results/incremental/windows.csv"
+WINDOW_META_FILE = "results/incremental/windows.json"  # Settings and energy log fingerprint of WINDOW_STATE_FILE
+HASH_BLOCK_SIZE = 1 << 20
+AGGREGATES_FILE = "results/engine_aggregates.csv"
+KEY_COLUMNS = ["Search Engine", "Iteration", "Start Time"]
+AGGREGATE_METRICS = ["Total Energy (J)", "Average Power (W)", "Duration (s)", "Net Energy (J)"]
+
+
+def prefix_hash(path, size):
+    """Content hash of the first `size` bytes of a file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while size > 0:
+            block = f.read(min(HASH_BLOCK_SIZE, size))
+            if not block:
+                break
+            digest.update(block)
+            size -= len(block)
+    return digest.hexdigest()
+
+
+def state_meta(settings, log_file):
+    """Settings (JSON-able dict) and fingerprint of log_file to save with the window state."""
+    size = os.path.getsize(log_file)
+    return {"settings": json.loads(json.dumps(settings)), "log_size": size, "log_hash": prefix_hash(log_file, size)}
+
+
+def state_is_valid(meta, settings, log_file):
+    """True if the state was computed with `settings` on a log that log_file only appends to."""
+    if meta is None or meta.get("settings") != json.loads(json.dumps(settings)):
+        return False
+    size = meta.get("log_size", -1)
+    return (os.path.exists(log_file) and 0 <= size <= os.path.getsize(log_file)
+            and prefix_hash(log_file, size) == meta.get("log_hash"))
+
+
+def load_window_state(buffer_ms, settings, log_file, state_file=WINDOW_STATE_FILE, meta_file=WINDOW_META_FILE):
+    """
+    Persisted per-window results computed with `buffer_ms` and `settings`, or None if there are none.
+
+    The state is also None if log_file is not the log it was computed from,
+    with rows appended at most.
+    """
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with open(meta_file) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        meta = None
+    if not state_is_valid(meta, settings, log_file):
+        return None
+    state = pd.read_csv(state_file)
+    state = state[state["Buffer (ms)"] == buffer_ms]
+    return state if not state.empty else None
+
+
+def select_new_windows(timestamps_df, state):
+    """Rows of timestamps_df whose window key is not in `state`."""
+    if state is None:
+        return timestamps_df
+    known = pd.MultiIndex.from_frame(state[KEY_COLUMNS])
+    is_new = ~pd.MultiIndex.from_frame(timestamps_df[KEY_COLUMNS]).isin(known)
+    return timestamps_df[is_new]
+
+
+def merge_window_results(state, new_timestamps_df, new_results_df, timestamps_df, buffer_ms):
+    """
+    Add the results of the new windows to the state.
+
+    Returns (results_df, state): the results of every window in timestamps_df,
+    in timestamps order, and the updated state to persist.
+    """
+    if not new_results_df.empty:
+        new_state = new_results_df.copy()
+        new_state["Start Time"] = new_timestamps_df["Start Time"].to_numpy()
+        new_state["Buffer (ms)"] = buffer_ms
+        state = new_state if state is None else pd.concat([state, new_state], ignore_index=True)
+    state = timestamps_df[KEY_COLUMNS].merge(state, on=KEY_COLUMNS, how="inner")
+    results_df = state.drop(columns=["Start Time", "Buffer (ms)"])
+    return results_df, state
+
+
+def save_window_state(state, settings, log_file, state_file=WINDOW_STATE_FILE, meta_file=WINDOW_META_FILE):
+    os.makedirs(os.path.dirname(state_file), exist_ok=True)
+    state.to_csv(state_file, index=False)
+    with open(meta_file, "w") as f:
+        json.dump(state_meta(settings, log_file), f, indent=2)
+
+
+def append_samples(sample_df, sample_file):
+    """Append the samples of new windows to the sample export."""
+    if sample_df.empty:
+        return
+    os.makedirs(os.path.dirname(sample_file), exist_ok=True)
+    sample_df.to_csv(sample_file, mode="a", header=not os.path.exists(sample_file), index=False)
+
+
+def update_aggregates(aggregates_df, new_results_df, metrics=AGGREGATE_METRICS):
+    """
+    Merge per-engine count, mean and M2 of the new results into the running aggregates.
+
+    Uses the parallel (Chan et al.) update, so the previous windows are never
+    revisited. Returns a DataFrame with one row per (engine, metric).
+    """
+    long_df = new_results_df.melt(id_vars="Search Engine", value_vars=metrics,
+                                  var_name="Metric", value_name="Value").dropna(subset=["Value"])
+    long_df["Value"] = long_df["Value"].astype(float)
+    grouped = long_df.groupby(["Search Engine", "Metric"])["Value"]
+    batch = pd.DataFrame({"Count": grouped.count(), "Mean": grouped.mean(),
+                          "M2": grouped.var(ddof=0) * grouped.count()})
+
+    if aggregates_df is None or aggregates_df.empty:
+        merged = batch
+    else:
+        previous = aggregates_df.set_index(["Search Engine", "Metric"])[["Count", "Mean", "M2"]]
+        previous, batch = previous.align(batch, join="outer", fill_value=0)
+        count = previous["Count"] + batch["Count"]
+        delta = batch["Mean"] - previous["Mean"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = previous["Mean"] + delta * np.where(count > 0, batch["Count"] / count, 0)
+            m2 = previous["M2"] + batch["M2"] + delta ** 2 * np.where(count > 0, previous["Count"] * batch["Count"] / count, 0)
+        merged = pd.DataFrame({"Count": count, "Mean": mean, "M2": m2})
+
+    merged["Std"] = np.sqrt(merged["M2"] / (merged["Count"] - 1).where(merged["Count"] > 1))
+    return merged.reset_index()
+
+
+def load_aggregates(aggregates_file=AGGREGATES_FILE):
+    return pd.read_csv(aggregates_file) if os.path.exists(aggregates_file) else None
@@ -0,0 +1,172 @@
+"""
+Shared logging and timing instrumentation for the pipeline scripts.
+
+`span` times a block (wall and CPU time) and nests: spans opened inside
+another span on the same thread become its children, so a stage span
+collects the spans of the steps it runs. `count` adds to a counter of the
+innermost open span, e.g. the rows parsed or windows computed. Spans that
+`profile` are run under cProfile and/or tracemalloc when the PROFILE
+environment variable asks for it. `write_profile` dumps every finished top-level
+span, and totals per span name, as JSON.
+"""
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE = {mode.strip() for mode in os.getenv("PROFILE", "").split(",") if mode.strip()}  # "cprofile", "tracemalloc"
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")  # cProfile output of the profiled spans
+
+_lock = threading.Lock()
+_local = threading.local()
+_roots = []
+
+
+def log_message(message):
+    """Print a timestamped log message."""
+    print(f"[{datetime.now()}] {message}")
+
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.started = datetime.now()
+        self.wall_s = None
+        self.cpu_s = None
+        self.counters = {}
+        self.children = []
+        self.extra = {}
+
+    def to_dict(self):
+        record = {"name": self.name, "started": self.started.isoformat(timespec="milliseconds"),
+                  "wall_s": self.wall_s, "cpu_s": self.cpu_s}
+        if self.counters:
+            record["counters"] = dict(self.counters)
+        record.update(self.extra)
+        if self.children:
+            record["children"] = [child.to_dict() for child in self.children]
+        return record
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _attach(span):
+    stack = _stack()
+    if stack:
+        stack[-1].children.append(span)
+    else:
+        with _lock:
+            _roots.append(span)
+
+
+@contextmanager
+def span(name, profile=False, **counters):
+    """
+    Time the block as a span named `name`, nested in the current span of this thread.
+
+    Keyword arguments are initial counter values. With profile=True the block
+    also runs under the profilers listed in PROFILE: cProfile stats are saved
+    to PROFILE_DIR/<name>.prof and the tracemalloc peak is recorded in the
+    span. tracemalloc is process-wide, so spans running at the same time
+    share one peak.
+    """
+    current = Span(name)
+    current.counters.update(counters)
+    _attach(current)
+    stack = _stack()
+    stack.append(current)
+
+    profiler = cProfile.Profile() if profile and "cprofile" in PROFILE else None
+    trace = profile and "tracemalloc" in PROFILE
+    started_tracing = False
+    if trace:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        tracemalloc.reset_peak()
+    if profiler:
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this process (Python 3.12+ allows only one)
+            profiler = None
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield current
+    except BaseException as e:
+        current.extra["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.wall_s = time.perf_counter() - wall
+        current.cpu_s = time.thread_time() - cpu
+        if profiler:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{name.replace(os.sep, '_')}.prof")
+            profiler.dump_stats(path)
+            current.extra["cprofile"] = path
+        if trace:
+            current.extra["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            if started_tracing:
+                tracemalloc.stop()
+        stack.pop()
+
+
+def add_span(name, wall_s, cpu_s=None, **counters):
+    """Record work timed elsewhere (e.g. in a worker process) as a finished span."""
+    finished = Span(name)
+    finished.wall_s, finished.cpu_s = wall_s, cpu_s
+    finished.counters.update(counters)
+    _attach(finished)
+    return finished
+
+
+def count(name, n=1):
+    """Add n to counter `name` of the current span; ignored outside spans."""
+    stack = _stack()
+    if stack:
+        counters = stack[-1].counters
+        counters[name] = counters.get(name, 0) + n
+
+
+def profile_report():
+    """The finished top-level spans as a list of dicts, in start order."""
+    with _lock:
+        roots = [root for root in _roots if root.wall_s is not None]
+    return [root.to_dict() for root in sorted(roots, key=lambda root: root.started)]
+
+
+def span_totals(records):
+    """Call count, total wall time and summed counters per span name over the span trees."""
+    totals = {}
+    pending = list(records)
+    while pending:
+        record = pending.pop()
+        total = totals.setdefault(record["name"], {"calls": 0, "wall_s": 0.0})
+        total["calls"] += 1
+        total["wall_s"] += record["wall_s"] or 0.0
+        for name, value in record.get("counters", {}).items():
+            total[name] = total.get(name, 0) + value
+        pending.extend(record.get("children", []))
+    return dict(sorted(totals.items(), key=lambda item: -item[1]["wall_s"]))
+
+
+def reset():
+    with _lock:
+        _roots.clear()
+
+
+def write_profile(path, **meta):
+    """Write the profile report and its per-name totals, with `meta` as extra top-level fields, to path as JSON."""
+    spans = profile_report()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({**meta, "totals": span_totals(spans), "spans": spans}, f, indent=2, default=str)
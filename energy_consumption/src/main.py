@@ -1,6 +1,64 @@
+import argparse
 import importlib
+import json
 import sys
 import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import instrumentation
+from config import BASELINE_STORE_FILE, PROFILE_FILE, RESAMPLING_FILE, TIMESTAMPS_FILE
+from energy_cache import CACHE_DIR, file_hash
+from instrumentation import add_span, span
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_STATE_FILE = os.path.join(CACHE_DIR, "pipeline_state.json")
+
+# Stages of the pipeline. A stage is skipped when all its outputs exist and the
+# hashes of its inputs (data files, its source file and every local module it
+# imports, config.py included, and environment settings) match the ones
+# recorded after its last successful run. Stages whose dependencies are done
+# run concurrently. An output given as (path, VAR) is only expected while the
+# environment variable VAR is not "0".
+STAGES = {
+    "baseline_measurement": {
+        "depends": [],
+        "inputs": ["baseline_measurement.py", "driver_pool.py", "baseline_store.py", "page_scripts.py",
+                   "instrumentation.py", "config.py"],
+        "env": ["DRIVER_MAX_USES", "BASELINE_WORKERS", "BASELINE_MAX_AGE_DAYS"],
+        "outputs": ["baseline_average.csv", BASELINE_STORE_FILE],
+    },
+    "measure": {
+        "depends": ["baseline_measurement"],
+        "inputs": ["measure.py", "page_scripts.py", "instrumentation.py", "config.py", "baseline_average.csv"],
+        "env": [],
+        "outputs": [TIMESTAMPS_FILE],
+    },
+    "process_energy": {
+        "depends": ["measure"],
+        "inputs": ["process_energy.py", "energy_engine.py", "energy_io.py", "energy_cache.py", "stats_engine.py",
+                   "resampling.py", "incremental.py", "time_bins.py", "parallel_windows.py", "idle_power.py",
+                   "baseline_store.py", "instrumentation.py", "config.py", TIMESTAMPS_FILE, "energy_log.csv",
+                   BASELINE_STORE_FILE],
+        "env": ["INTERVAL", "STREAM_CHUNKSIZE", "WINDOW_WORKERS", "RESAMPLES", "COUNTER_WRAP_J",
+                "IDLE_SETTLE_MS", "IDLE_MIN_REST_MS", "BASELINE_STATISTIC", "INCLUDE_UNDETECTED", "INCREMENTAL",
+                "CSV_CACHE"],
+        "outputs": ["results/final_energy_results.csv", "results/final_energy_samples.csv",
+                    "results/statistical_tests.csv", "results/pairwise_comparisons.csv",
+                    "results/time_binned_samples.csv", (RESAMPLING_FILE, "RESAMPLES")],
+    },
+    "plot_results": {
+        "depends": ["process_energy"],
+        "inputs": ["plot_results.py", "time_bins.py", "downsample.py", "energy_cache.py", "resampling.py",
+                   "instrumentation.py", "config.py", "results/final_energy_results.csv",
+                   "results/time_binned_samples.csv", "results/final_energy_samples.csv",
+                   "results/pairwise_comparisons.csv", TIMESTAMPS_FILE],
+        "env": ["PLOT_POINTS", "CSV_CACHE"],
+        "outputs": ["results/plots/violin_total_energy.png", "results/plots/aggregated_metrics.png",
+                    "results/plots/power_traces.png"],
+    },
+}
 
 def ensure_directories_exist():
     directories = ["search_engine_results", "results", "plots"]
@@ -9,56 +67,183 @@ def ensure_directories_exist():
             os.makedirs(directory)
             print(f"Created directory: {directory}")
 
-def run_measurement_pipeline():
+def input_path(path):
+    """Stage inputs ending in .py are source files next to main.py."""
+    return os.path.join(SRC_DIR, path) if path.endswith(".py") else path
+
+def fingerprint(path, previous=None):
+    """Size, mtime and content hash of `path`; the hash is reused while size and mtime are unchanged."""
+    path = input_path(path)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    state = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if previous and previous["size"] == state["size"] and previous["mtime_ns"] == state["mtime_ns"]:
+        state["hash"] = previous["hash"]
+    else:
+        state["hash"] = file_hash(path)
+    return state
+
+def stage_inputs(name, previous=None):
+    stage = STAGES[name]
+    previous = previous or {}
+    files = {path: fingerprint(path, previous.get("files", {}).get(path)) for path in stage["inputs"]}
+    return {"files": files, "env": {var: os.getenv(var) for var in stage["env"]}}
+
+def stage_outputs(name):
+    """Outputs the stage is expected to write with the current environment."""
+    return [output if isinstance(output, str) else output[0] for output in STAGES[name]["outputs"]
+            if isinstance(output, str) or os.getenv(output[1]) != "0"]
+
+def is_up_to_date(name, state):
+    """True if the stage's outputs exist and its inputs hash as in its last run."""
+    if name not in state or not all(os.path.exists(path) for path in stage_outputs(name)):
+        return False
+    previous = state[name]
+    current = stage_inputs(name, previous)
+    # An optional input that is still missing counts as unchanged
+    same_files = all((previous["files"].get(path) or {}).get("hash") == (current["files"][path] or {}).get("hash")
+                     for path in current["files"])
+    return same_files and previous["env"] == current["env"]
+
+def load_state():
+    try:
+        with open(PIPELINE_STATE_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state):
+    os.makedirs(os.path.dirname(PIPELINE_STATE_FILE), exist_ok=True)
+    with open(PIPELINE_STATE_FILE, "w") as f:
+        json.dump(state, f, indent=2)
+
+def run_stage(module_name):
+    print(f"\n{'='*80}")
+    print(f"Running {module_name}.py...")
+    print(f"{'='*80}\n")
+
+    # Force reload in case the module was previously imported
+    if module_name in sys.modules:
+        del sys.modules[module_name]
+
+    # Spans opened by the stage nest under this one; PROFILE=cprofile,tracemalloc profiles the stage
+    with span(module_name, profile=True):
+        module = importlib.import_module(module_name)
+
+        # If the module has a main function, use it
+        if hasattr(module, 'main'):
+            # A stage fails by raising, calling sys.exit with a non-zero code or returning one
+            try:
+                status = module.main()
+            except SystemExit as e:
+                status = e.code
+            if status not in (None, 0):
+                raise RuntimeError(f"{module_name}.main() exited with status {status}")
+        # Otherwise, the module's global code will run on import
+
+    print(f"\n{module_name}.py completed successfully.")
+
+def downstream(names):
+    """`names` and every stage that depends on them, directly or indirectly."""
+    selected = set(names)
+    changed = True
+    while changed:
+        changed = False
+        for name, stage in STAGES.items():
+            if name not in selected and selected.intersection(stage["depends"]):
+                selected.add(name)
+                changed = True
+    return selected
+
+def run_stages(selected, force=(), workers=2):
+    """
+    Run the selected stages in dependency order, skipping up-to-date ones.
+
+    Stages in `force` always run. Stages outside `selected` are treated as
+    done. Returns False if a stage failed.
+    """
+    state = load_state()
+    done = set(STAGES) - set(selected)
+    pending = [name for name in STAGES if name in selected]
+    running = {}
+    failed = False
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while (pending and not failed) or running:
+            for name in list(pending):
+                if failed or not set(STAGES[name]["depends"]) <= done:
+                    continue
+                pending.remove(name)
+                if name not in force and is_up_to_date(name, state):
+                    print(f"Skipping {name}.py: outputs are up to date.")
+                    add_span(name, 0.0).extra["skipped"] = True
+                    done.add(name)
+                    continue
+                # Input hashes are taken before the run, so inputs changed meanwhile trigger a re-run
+                running[executor.submit(run_stage, name)] = (name, stage_inputs(name, state.get(name)))
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, inputs = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error running {name}.py: {e}")
+                    print("Pipeline execution stopped due to error.")
+                    failed = True
+                    continue
+                state[name] = inputs
+                save_state(state)
+                done.add(name)
+    return not failed
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Run the search engine energy measurement pipeline.")
+    parser.add_argument("interval", nargs="?", default="200", help="Buffer interval in ms (default 200)")
+    parser.add_argument("--from", dest="from_stage", choices=list(STAGES),
+                        help="Re-run this stage and the stages that depend on it")
+    parser.add_argument("--only", nargs="+", choices=list(STAGES), help="Run only these stages")
+    parser.add_argument("--force", action="store_true", help="Run the selected stages even if up to date")
+    parser.add_argument("--workers", type=int, default=2, help="Stages that may run at the same time")
+    return parser.parse_args(argv)
+
+def run_measurement_pipeline(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
     # Ensure output directories exist
     ensure_directories_exist()
-    
+
     interval = 200
-    if len(sys.argv) > 1:
-        try:
-            interval = int(sys.argv[1])
-        except ValueError:
-            print(f"Invalid interval value: {sys.argv[1]}, using default 200.")
+    try:
+        interval = int(args.interval)
+    except ValueError:
+        print(f"Invalid interval value: {args.interval}, using default 200.")
 
     os.environ["INTERVAL"] = str(interval)
 
-    # List of modules to run in order
-    modules_to_run = [
-        'baseline_measurement',
-        'measure',
-        'process_energy',
-        'plot_results'
-    ]
-    
-    # Run each module in sequence
-    for module_name in modules_to_run:
-        print(f"\n{'='*80}")
-        print(f"Running {module_name}.py...")
-        print(f"{'='*80}\n")
-        
-        # Import and run the module
-        try:
-            # Force reload in case the module was previously imported
-            if module_name in sys.modules:
-                del sys.modules[module_name]
-                
-            module = importlib.import_module(module_name)
-            
-            # If the module has a main function, use it
-            if hasattr(module, 'main'):
-                module.main()
-            # Otherwise, the module's global code will run on import
-            
-            print(f"\n{module_name}.py completed successfully.")
-            
-        except Exception as e:
-            print(f"Error running {module_name}.py: {e}")
-            print("Pipeline execution stopped due to error.")
-            return False
-    
+    if args.only:
+        selected, force = set(args.only), set(args.only) if args.force else set()
+    elif args.from_stage:
+        selected = downstream([args.from_stage])
+        force = selected if args.force else {args.from_stage}
+    else:
+        selected = set(STAGES)
+        force = selected if args.force else set()
+
+    instrumentation.reset()
+    started, wall = datetime.now(), time.perf_counter()
+    ok = run_stages(selected, force, args.workers)
+    instrumentation.write_profile(PROFILE_FILE, started=started.isoformat(timespec="seconds"),
+                                  argv=sys.argv[1:] if argv is None else argv,
+                                  wall_s=time.perf_counter() - wall, ok=ok)
+    print(f"Stage profile saved to {PROFILE_FILE}")
+    if not ok:
+        return False
+
     print("\n\nComplete measurement pipeline executed successfully!")
     print("Check the 'plots' directory for visualization results.")
     return True
 
 if __name__ == "__main__":
-    run_measurement_pipeline()
\ No newline at end of file
+    run_measurement_pipeline()
@@ -20,48 +20,28 @@ from selenium.common.exceptions import (
 
 from selenium.webdriver.common.action_chains import ActionChains
 
-# Search Engines
-SEARCH_ENGINES = {
-    "Google": "https://www.google.com", 
-    "Bing": "https://www.bing.com",
-    "Yahoo": "https://www.yahoo.com", 
-    "DuckDuckGo": "https://www.duckduckgo.com",
-    "Brave Search": "https://search.brave.com",
-    "Ecosia": "https://www.ecosia.org",
-    "OceanHero": "https://oceanhero.today",
-    "Startpage": "https://www.startpage.com",
-    "Qwant": "https://www.qwant.com",
-    "Swisscows": "https://www.swisscows.com",
-    "Mojeek": "https://www.mojeek.com",
-    "You.com": "https://you.com",
+from config import (DEFAULT_DURATION, DEFAULT_WARMUP, ITERATIONS, SEARCH_ENGINES, SEARCH_QUERIES,
+                    TIMESTAMPS_FILE as OUTPUT_FILE, load_baseline_overhead)
+from instrumentation import count, log_message, span
+from page_scripts import find_first, wait_for_results
+
+RESULTS_TIMEOUT = 10  # Seconds to wait for the results after submitting a query (below the 15 s script timeout of handle_yahoo)
+# Results containers per engine, in order of preference; other engines use DEFAULT_RESULTS_SELECTORS,
+# which can also match a home page, so they only count after the browser navigated away from it
+RESULTS_SELECTORS = {
+    "Google": [(By.ID, "rso"), (By.ID, "search")],
+    "Bing": [(By.ID, "b_results")],
+    "Yahoo": [(By.CSS_SELECTOR, ".searchCenterMiddle"), (By.ID, "web"), (By.CSS_SELECTOR, ".algo"), (By.ID, "results")],
+    "DuckDuckGo": [(By.CSS_SELECTOR, "[data-testid='result']"), (By.ID, "links")],
+    "Ecosia": [(By.CSS_SELECTOR, "[data-test-id='mainline-result-web']"), (By.CSS_SELECTOR, ".mainline")],
+    "Startpage": [(By.CSS_SELECTOR, ".w-gl"), (By.CSS_SELECTOR, ".result")],
+    "Brave Search": [(By.ID, "results"), (By.CSS_SELECTOR, ".snippet")],
+    "Mojeek": [(By.CSS_SELECTOR, "ul.results-standard")],
 }
-
-SEARCH_QUERIES = [
-    "angular route uib tab",
-    # "react setstate sub property",
-    # "bootstrap button next to input",
-    # "forcelayout api",
-    # "golang copy built in",
-    # "strlen",
-    # "java comparator interface",
-    # "ubuntu search packages",
-    # "URI uri = new URIBuilder",
-    # "java throw exception example",
-    # "mdn transform origin",
-    # "segmented circle css",
-    # "show is not a member of org.apache.spark.sql.GroupedData",
-    # "babel-jest can't console log in babel jest",
-    # "json minify"
+DEFAULT_RESULTS_SELECTORS = [
+    (By.CSS_SELECTOR, "[data-testid='result'], [data-testid='webResult'], .result, .results, #results, main article"),
 ]
 
-DEFAULT_DURATION = 60 #60 # Search test duration in seconds
-DEFAULT_WARMUP = 300 #300  # Warmup duration in seconds (should be 300 for real tests)
-OUTPUT_FILE = "search_engine_results/search_engine_timestamps.csv"
-ITERATIONS = 30 #30  # Number of test iterations
-
-baseline_df = pd.read_csv("baseline_average.csv", sep=";")
-BASE_LINE_OVERHEAD = baseline_df.set_index("Search Engine")["Baseline Duration (ms)"].to_dict()
-
 def check_internet():
     """Returns True if internet is available, False otherwise."""
     try:
@@ -118,10 +98,6 @@ def keep_system_awake():
     except Exception as e:
         log_message(f"Error in keep_system_awake: {e}")
 
-def log_message(message):
-    """Print a timestamped log message."""
-    print(f"[{datetime.now()}] {message}")
-
 def warm_up(duration=DEFAULT_WARMUP):
     log_message(f"Warming up system for {duration} seconds...")
     def fib(n):
@@ -197,11 +173,8 @@ def handle_google(driver, query):
         search_box.clear()
         search_box.send_keys(query)
         
-        # Submit immediately with Enter key (no random delay)
+        # Submit immediately with Enter key (no random delay); test_search_engine waits for the results
         search_box.send_keys(Keys.RETURN)
-        
-        # Minimal wait for results (adjust based on your needs)
-        time.sleep(1)
         return True
         
     except Exception as e:
@@ -297,6 +270,7 @@ def handle_yahoo(driver, query):
             """)
         ]
         random.shuffle(submit_methods)
+        submitted_at = int(datetime.now().timestamp() * 1000)
         submitted = False
         for method in submit_methods:
             try:
@@ -309,20 +283,15 @@ def handle_yahoo(driver, query):
         if not submitted:
             raise Exception("Failed to submit search")
 
-        time.sleep(random.uniform(1, 2))
         if len(driver.window_handles) > 1:
             for handle in driver.window_handles:
                 if handle != original_handle:
                     driver.switch_to.window(handle)
                     break
 
-        WebDriverWait(driver, random.uniform(5, 8)).until(
-            lambda d: d.execute_script(
-                "return Boolean(document.querySelector('.searchCenterMiddle, #results, .algo, #web'))"
-            )
-        )
+        if wait_for_results(driver, RESULTS_SELECTORS["Yahoo"], RESULTS_TIMEOUT, submitted_at) is None:
+            raise TimeoutException()
         print("Search successful!")
-        time.sleep(random.uniform(0.5, 1.5))
         return True
 
     except TimeoutException:
@@ -362,7 +331,6 @@ def handle_bing(driver, query):
     """Handle Bing search with improved error handling and multiple fallback methods"""
     try:
         log_message("Opening Bing...")
-        time.sleep(2)  # Wait for page load
         
         # Handle cookie consent with explicit wait
         try:
@@ -410,8 +378,6 @@ def handle_bing(driver, query):
                     log_message(f"All search submission methods failed: {str(e)}")
                     return False
             
-            # Wait for results to load
-            time.sleep(2)
             return True
             
         except Exception as e:
@@ -424,27 +390,18 @@ def handle_bing(driver, query):
     
 def handle_duckduckgo(driver, query):
     try:
-        # Find the search box
-        search_box = WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.ID, "searchbox_input"))
-        )
+        # Find the search box, or the alternative selector
+        search_box, _ = find_first(driver, [(By.ID, "searchbox_input"), (By.NAME, "q")], timeout=5)
+        if search_box is None:
+            log_message("Error with DuckDuckGo search: search box not found")
+            return False
         search_box.clear()
         search_box.send_keys(query)
         search_box.send_keys(Keys.RETURN)
         return True
-    except TimeoutException:
-        # Try alternative selector
-        try:
-            search_box = WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located((By.NAME, "q"))
-            )
-            search_box.clear()
-            search_box.send_keys(query)
-            search_box.send_keys(Keys.RETURN)
-            return True
-        except Exception as e:
-            log_message(f"Error with DuckDuckGo search: {e}")
-            return False
+    except Exception as e:
+        log_message(f"Error with DuckDuckGo search: {e}")
+        return False
 
 def handle_ecosia(driver, query):
     try:
@@ -473,21 +430,12 @@ def handle_ecosia(driver, query):
 def handle_startpage(driver, query):
     try:
         # Wait for the search box with multiple possible selectors
-        search_box = None
         selectors = [
             (By.NAME, "query"),
             (By.CSS_SELECTOR, "input[type='text']"),
             (By.CSS_SELECTOR, "input[type='search']")
         ]
-        
-        for selector_type, selector_value in selectors:
-            try:
-                search_box = WebDriverWait(driver, 5).until(
-                    EC.element_to_be_clickable((selector_type, selector_value))
-                )
-                break
-            except TimeoutException:
-                continue
+        search_box, _ = find_first(driver, selectors, timeout=5)
         
         if search_box:
             # Clear using JavaScript
@@ -520,15 +468,7 @@ def handle_default_search(driver, query):
             (By.XPATH, "//input[contains(@placeholder, 'Search')]")
         ]
         
-        search_box = None
-        for selector_type, selector_value in selectors:
-            try:
-                search_box = WebDriverWait(driver, 1).until(
-                    EC.presence_of_element_located((selector_type, selector_value))
-                )
-                break
-            except TimeoutException:
-                continue
+        search_box, _ = find_first(driver, selectors, timeout=5)
         
         if search_box:
             search_box.clear()
@@ -571,7 +511,8 @@ def test_search_engine(engine, url, query, duration, baseline_overheads, driver)
     start_time = int(datetime.now().timestamp() * 1000)  # Convert to milliseconds
 
     # Set up WebDriver with anti-detection measures
-    driver.get(url)
+    with span("page load"):
+        driver.get(url)
    
 
     # Add a small random delay to appear more human-like
@@ -590,13 +531,31 @@ def test_search_engine(engine, url, query, duration, baseline_overheads, driver)
         "Startpage": handle_startpage
     }
     
-    search_success = handlers.get(engine, handle_default_search)(driver, query)
+    search_time = int(datetime.now().timestamp() * 1000)
+    search_url = driver.current_url
+    with span("search"):
+        search_success = handlers.get(engine, handle_default_search)(driver, query)
+    count("queries")
     
     # If search was successful, wait for the specified duration
     if search_success:
+        # Wait for the results themselves rather than a fixed time, and record when they showed up
+        with span("results"):
+            if engine in RESULTS_SELECTORS:
+                results_time = wait_for_results(driver, RESULTS_SELECTORS[engine], RESULTS_TIMEOUT, search_time)
+            else:
+                results_time = wait_for_results(driver, DEFAULT_RESULTS_SELECTORS, RESULTS_TIMEOUT, search_time,
+                                                start_url=search_url)
+        if results_time is None:
+            log_message(f"No results detected for {engine} within {RESULTS_TIMEOUT} s")
+            count("undetected_results")
+        else:
+            log_message(f"Results of {engine} visible {results_time - search_time} ms after the search started")
+
         wait_time = duration
         log_message(f"Waiting {wait_time:.1f} seconds before next query...")
-        time.sleep(wait_time)
+        with span("wait"):
+            time.sleep(wait_time)
         
         # Log end time
         end_time = int(datetime.now().timestamp() * 1000)
@@ -618,10 +577,17 @@ def test_search_engine(engine, url, query, duration, baseline_overheads, driver)
             "End Time": end_time,
             "Raw Duration (ms)": raw_duration,
             "Baseline Overhead (ms)": baseline,
-            "Normalized Duration (ms)": normalized_duration
+            "Normalized Duration (ms)": normalized_duration,
+            # False when the results were not detected within RESULTS_TIMEOUT: the window then
+            # includes up to RESULTS_TIMEOUT of polling and process_energy leaves it out
+            "Results Detected": results_time is not None,
+            "Results Time": results_time,
+            # From the start of the query, so it includes loading the home page and typing the query
+            "Time to Results (ms)": results_time - start_time if results_time is not None else None
         }
     else:
         log_message(f"Search failed for {engine}")
+        count("failed_queries")
         driver.delete_all_cookies()
         return None
 
@@ -645,7 +611,8 @@ def run_tests(engines, queries, duration, baseline_overheads, driver):
                 log_message(f"Failed to test {engine}")
             
     log_message(f"Waiting {duration:.1f} seconds before next test...")
-    time.sleep(duration)
+    with span("wait"):
+        time.sleep(duration)
     
     return results
 
@@ -674,21 +641,27 @@ def main():
     all_results = []
 
     # Perform system warm-up
-    warm_up()
+    with span("warm-up"):
+        warm_up()
     
-    log_message(f"Baseline overheads: {BASE_LINE_OVERHEAD}")
-    driver = DriverManager.get_driver()
+    baseline_overhead = load_baseline_overhead()
+    if not baseline_overhead:
+        log_message("Warning: baseline_average.csv not found, run baseline_measurement.py first. Using no baseline overhead.")
+    log_message(f"Baseline overheads: {baseline_overhead}")
+    with span("driver setup"):
+        driver = DriverManager.get_driver()
 
     for i in range(ITERATIONS):
         log_message(f"--- Iteration {i + 1} of {ITERATIONS} ---")
         # Run tests on all search engines for all queries in this iteration
-        results = run_tests(
-            engines=SEARCH_ENGINES,
-            queries=SEARCH_QUERIES,
-            duration=DEFAULT_DURATION,
-            baseline_overheads=BASE_LINE_OVERHEAD,
-            driver=driver
-        )
+        with span(f"iteration {i + 1}"):
+            results = run_tests(
+                engines=SEARCH_ENGINES,
+                queries=SEARCH_QUERIES,
+                duration=DEFAULT_DURATION,
+                baseline_overheads=baseline_overhead,
+                driver=driver
+            )
         
         # Append an iteration number to each result for later grouping
         if results:
@@ -0,0 +1,168 @@
+"""
+JavaScript helpers that run in the page in a single WebDriver round trip.
+
+Looking elements up with one WebDriverWait per candidate selector costs a
+WebDriver round trip per poll and, when the early candidates are missing,
+their whole timeout, inside the measured window. `find_first` sends the
+ordered candidate list to the page once; the page checks it right away and
+then again on every DOM mutation (and on a short interval, for changes that
+only affect layout) until a candidate matches or the deadline passes.
+`wait_for_results` waits the same way for a search engine's results and
+reports when they became visible.
+"""
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+POLL_INTERVAL_MS = 100  # Re-check for changes that do not mutate the DOM, e.g. stylesheets loading
+
+# Shared by the scripts below. Candidates are [how, what] pairs, where `how` is
+# a selenium By value: "id", "name", "css selector" or "xpath".
+_PROBE_FUNCTIONS = """
+function locate(how, what) {
+  if (how === "xpath") {
+    const found = document.evaluate(what, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    return Array.from({length: found.snapshotLength}, (_, i) => found.snapshotItem(i));
+  }
+  if (how === "id") {
+    const element = document.getElementById(what);
+    return element ? [element] : [];
+  }
+  if (how === "name") return Array.from(document.getElementsByName(what));
+  return Array.from(document.querySelectorAll(what));
+}
+
+function usable(element) {
+  const style = getComputedStyle(element);
+  const rect = element.getBoundingClientRect();
+  return style.visibility !== "hidden" && style.display !== "none" && rect.width > 0 && rect.height > 0
+    && !element.disabled && !element.readOnly;
+}
+
+function probe(candidates) {
+  for (let i = 0; i < candidates.length; i++) {
+    let element;
+    try {
+      element = locate(candidates[i][0], candidates[i][1]).find(usable);
+    } catch (e) {
+      continue;  // Invalid selector: try the next one
+    }
+    if (element) return [element, i];
+  }
+  return null;
+}
+
+// Call done(check()) as soon as check() returns non-null: now, after a DOM
+// mutation or every pollMs, or done(null) after timeoutMs.
+function watch(check, timeoutMs, pollMs, done) {
+  const first = check();
+  if (first) return done(first);
+  let finished = false;
+  const finish = (result) => {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearInterval(poll);
+    clearTimeout(timer);
+    done(result);
+  };
+  const recheck = () => {
+    const result = check();
+    if (result) finish(result);
+  };
+  const observer = new MutationObserver(recheck);
+  observer.observe(document, {childList: true, subtree: true, attributes: true});
+  const poll = setInterval(recheck, pollMs);
+  const timer = setTimeout(() => finish(null), timeoutMs);
+}
+"""
+
+# arguments: candidates, timeout (ms), poll interval (ms), callback
+FIND_FIRST_SCRIPT = _PROBE_FUNCTIONS + """
+const [candidates, timeoutMs, pollMs] = arguments;
+watch(() => probe(candidates), timeoutMs, pollMs, arguments[arguments.length - 1]);
+"""
+
+# arguments: candidates, timeout (ms), poll interval (ms), since (epoch ms), start URL or null, callback.
+# Returns the epoch ms the results became visible, or null. With a start URL,
+# candidates only count once the page left it: a different URL or a document
+# loaded after `since`. Results found when the script starts were rendered
+# earlier: their largest contentful paint, if it is after `since`, is when they
+# became visible.
+WAIT_FOR_RESULTS_SCRIPT = _PROBE_FUNCTIONS + """
+const [candidates, timeoutMs, pollMs, since, startUrl] = arguments;
+const done = arguments[arguments.length - 1];
+
+function largestPaint(callback) {
+  try {
+    const observer = new PerformanceObserver((list) => {
+      const entries = list.getEntries();
+      observer.disconnect();
+      callback(performance.timeOrigin + entries[entries.length - 1].startTime);
+    });
+    observer.observe({type: "largest-contentful-paint", buffered: true});
+    setTimeout(() => { observer.disconnect(); callback(null); }, 50);
+  } catch (e) {
+    callback(null);
+  }
+}
+
+let checks = 0;
+watch(() => {
+  checks++;
+  const navigated = startUrl === null || location.href !== startUrl || performance.timeOrigin >= since;
+  return navigated && document.readyState !== "loading" && probe(candidates) ? {checks, visible: Date.now()} : null;
+}, timeoutMs, pollMs, (found) => {
+  if (!found) return done(null);
+  if (found.checks > 1) return done(found.visible);
+  let reported = false;
+  largestPaint((paint) => {
+    if (reported) return;
+    reported = true;
+    done(paint !== null && paint >= since && paint <= found.visible ? Math.round(paint) : found.visible);
+  });
+});
+"""
+
+
+def find_first(driver, selectors, timeout):
+    """
+    The first of `selectors` with a visible, enabled match, waiting up to `timeout` seconds.
+
+    `selectors` is an ordered list of (By, value) pairs, as for WebDriverWait.
+    Returns (element, index of the matching selector), or (None, None) if
+    none matched in time. `timeout` should stay below the driver's script
+    timeout (30 s unless changed with set_script_timeout).
+    """
+    try:
+        result = driver.execute_async_script(FIND_FIRST_SCRIPT, [list(selector) for selector in selectors],
+                                             int(timeout * 1000), POLL_INTERVAL_MS)
+    except TimeoutException:
+        result = None
+    return (result[0], result[1]) if result else (None, None)
+
+
+def wait_for_results(driver, selectors, timeout, since_ms, start_url=None):
+    """
+    Time (epoch ms) the search results became visible, or None if they did not within `timeout` seconds.
+
+    Results are visible once the document is parsed and one of `selectors`
+    has a visible match. A search submitted just before usually navigates to
+    a results page: a script interrupted by the navigation is run again on
+    the new document. Results already shown when the new document is checked
+    are timed by their largest contentful paint, if that is after since_ms.
+    Generic selectors can also match the page the search was typed on: with
+    `start_url`, a match only counts once the browser has left that URL or
+    loaded a new document since since_ms.
+    """
+    deadline = time.monotonic() + timeout
+    while (remaining := deadline - time.monotonic()) > 0:
+        try:
+            return driver.execute_async_script(WAIT_FOR_RESULTS_SCRIPT, [list(selector) for selector in selectors],
+                                               int(remaining * 1000), POLL_INTERVAL_MS, since_ms, start_url)
+        except TimeoutException:
+            return None
+        except WebDriverException:
+            # The document was unloaded while the script ran
+            time.sleep(POLL_INTERVAL_MS / 1000)
+    return None
@@ -0,0 +1,141 @@
+"""
+Process-pool computation of window metrics.
+
+The query windows are sorted by start time and split into contiguous time
+ranges. The energy log's columns are copied once into shared memory; each
+worker attaches to them and indexes only the rows its windows cover, so the
+log is never pickled. Results are merged back in window order, so they do
+not depend on the order the workers finish in, and match EnergyIndex.query
+and window_samples on the whole log up to the rounding of its prefix sums.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from energy_engine import POWER_KEYS, EnergyIndex, empty_sums, energy_key, finalize_sums, temperature_columns
+from instrumentation import add_span
+
+
+def share_columns(frame):
+    """
+    Copy the numeric columns of `frame` into shared memory blocks.
+
+    Returns (blocks, specs): the SharedMemory objects, which the caller must
+    close and unlink, and a picklable (column, block name, dtype, length)
+    list workers use to attach to them.
+    """
+    blocks, specs = [], []
+    for column in frame.columns:
+        values = frame[column].to_numpy()
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, values.dtype, buffer=block.buf)[:] = values
+        blocks.append(block)
+        specs.append((column, block.name, values.dtype.str, len(values)))
+    return blocks, specs
+
+
+def attach_rows(specs, lo, hi):
+    """Copy of rows [lo, hi) of the shared columns described by `specs`, as a DataFrame."""
+    columns = {}
+    for column, name, dtype, length in specs:
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            columns[column] = np.array(np.ndarray((length,), dtype, buffer=block.buf)[lo:hi])
+        finally:
+            block.close()
+    return pd.DataFrame(columns)
+
+
+def partition_windows(times, starts, ends, n_parts):
+    """
+    Split the windows into up to n_parts groups of consecutive start times.
+
+    Groups cover about the same number of log rows. Returns a list of
+    (window positions, first row, end row) with the row range [first, end)
+    of `times` the group's windows cover.
+    """
+    order = np.argsort(starts, kind="stable")
+    lo = np.searchsorted(times, starts[order], side="left")
+    hi = np.searchsorted(times, ends[order], side="right")
+    cuts = np.searchsorted(lo, np.linspace(lo[0], hi.max(), n_parts + 1)[1:-1], side="left")
+    parts = []
+    for group in np.split(np.arange(len(order)), np.unique(cuts)):
+        if len(group):
+            parts.append((order[group], int(lo[group].min()), int(np.maximum(hi[group], lo[group]).max())))
+    return parts
+
+
+def _window_task(specs, key, first, end, starts, ends, keep):
+    """Additive sums (see EnergyIndex.range_sums) and samples of the windows [starts, ends] in log rows [first, end)."""
+    wall = time.perf_counter()
+    frame = attach_rows(specs, max(first - 1, 0), end)
+    # The row before the slice continues the power/energy series, as between stream chunks
+    previous = None
+    if first > 0:
+        previous = (frame[key].iloc[0], frame["Time"].iloc[0])
+        frame = frame.iloc[1:]
+    index = EnergyIndex(frame, key, previous=previous)
+    lo, hi = index.locate(starts, ends)
+    sums = index.range_sums(lo, hi)
+    samples, positions = index.window_samples(lo[keep], hi[keep])
+    return sums, samples, np.flatnonzero(keep)[positions], time.perf_counter() - wall
+
+
+def parallel_windows(energy_df, starts, ends, workers, keep_samples=True):
+    """
+    Window metrics and samples of [starts, ends] windows (ms), computed in `workers` processes.
+
+    Returns the same (windows, (samples, sample_windows)) as
+    energy_io.stream_windows with the same keep_samples.
+    """
+    key = energy_key(energy_df)
+    if not energy_df["Time"].is_monotonic_increasing:
+        energy_df = energy_df.sort_values("Time", kind="stable").reset_index(drop=True)
+    starts, ends = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+    keep = np.broadcast_to(np.asarray(keep_samples, dtype=bool), starts.shape)
+    times = energy_df["Time"].to_numpy(dtype=np.int64)
+
+    parts = []
+    if len(starts):
+        parts = partition_windows(times, starts, ends, workers)
+    # A leading missing counter reading would be forward-filled from earlier rows, so
+    # each slice starts at the last valid reading before its first window.
+    valid_rows = np.maximum.accumulate(np.where(~np.isnan(energy_df[key].to_numpy(dtype=np.float64)),
+                                                np.arange(len(times)), 0))
+    parts = [(positions, int(valid_rows[first]) if first < len(times) else first, end)
+             for positions, first, end in parts]
+
+    blocks, specs = share_columns(energy_df)
+    try:
+        with ProcessPoolExecutor(max_workers=max(min(workers, len(parts)), 1)) as executor:
+            futures = [executor.submit(_window_task, specs, key, first, end, starts[positions], ends[positions],
+                                       keep[positions])
+                       for positions, first, end in parts]
+            results = [future.result() for future in futures]
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    n_windows = len(starts)
+    n_temps = len(temperature_columns(energy_df.columns)) if key in POWER_KEYS else 0
+    totals = empty_sums(n_windows, n_temps)
+    sample_parts, window_parts = [], []
+    for (positions, first, end), (sums, samples, sample_positions, wall_s) in zip(parts, results):
+        add_span(f"window partition rows {first}-{end}", wall_s, windows=len(positions), rows=end - first)
+        for name, value in sums.items():
+            totals[name][positions] = value
+        if len(samples):
+            sample_parts.append(samples)
+            window_parts.append(positions[sample_positions])
+
+    if not sample_parts:
+        return finalize_sums(totals), (pd.DataFrame(), np.empty(0, dtype=np.int64))
+    # Stable sort by window keeps each window's samples in time order, as in EnergyIndex.window_samples
+    sample_windows = np.concatenate(window_parts)
+    order = np.argsort(sample_windows, kind="stable")
+    samples = pd.concat(sample_parts, ignore_index=True).take(order).reset_index(drop=True)
+    return finalize_sums(totals), (samples, sample_windows[order])
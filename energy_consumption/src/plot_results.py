@@ -1,53 +1,60 @@
 import os
-import ast
+import hashlib
+import json
+import time
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-FINAL_ENERGY_FILE = "results/final_energy_results.csv"
-SAVE_FIG_DIR = "results/plots"
-TIMESTAMPS_FILE = "search_engine_results/search_engine_timestamps.csv"
+from config import (FINAL_ENERGY_FILE, PAIRWISE_RESULTS_FILE, PLOTS_DIR as SAVE_FIG_DIR, SAMPLE_FILE, TIME_BINS_FILE,
+                    TIMESTAMPS_FILE, lazy_import)
+import downsample
+import time_bins
+from downsample import downsample_frame
+from energy_cache import cached_load, file_hash
+from instrumentation import add_span, log_message, span
+from resampling import with_edp_columns
+from time_bins import select_resolution, time_binned_aggregates
 
-def log_message(message):
-    """Print a timestamped log message."""
-    print(f"[{datetime.now()}] {message}")
+# seaborn and matplotlib are only imported once the first plot is drawn
+matplotlib = lazy_import("matplotlib")
+sns = lazy_import("seaborn")
+plt = lazy_import("matplotlib.pyplot")
+
+PLOT_WORKERS = int(os.getenv("PLOT_WORKERS", os.cpu_count() or 1))  # Processes rendering figures (1 renders in this process)
+PLOT_POINTS = int(os.getenv("PLOT_POINTS", 1000))  # Points per iteration in the raw power traces (0 disables downsampling)
+RENDER_ALL = os.getenv("RENDER_ALL", "0") != "0"  # Re-render figures even if their input data is unchanged
+RENDER_STATE_FILE = os.path.join(SAVE_FIG_DIR, ".render_state.json")
+
+# DataFrames shared with the rendering workers, set once per process by _init_worker
+_FRAMES = {}
 
 def ensure_dir(path):
     """Ensure the directory exists."""
     os.makedirs(path, exist_ok=True)
     
-def plot_power_across_iterations(sample_df, output_path_power="results/plots/power_across_iterations.png", output_path_memory="results/plots/memory_across_iterations.png"):
+def plot_power_across_iterations(binned_df, output_path_power="results/plots/power_across_iterations.png", output_path_memory="results/plots/memory_across_iterations.png"):
     """
     Plots average power (W) and used memory vs. time offset (s) for each search engine,
     averaged across all iterations.
+
+    `binned_df` is the time-binned aggregate table written by process_energy
+    (see time_bins.time_binned_aggregates); the 0.1 s bins are plotted.
     """
     # Check for required columns
-    required_columns = {"Search Engine", "Iteration", "Time", "Start_Time", "Power (W)", "USED_MEMORY"}
-    if not required_columns.issubset(sample_df.columns):
-        print("Sample DataFrame missing required columns for plots.")
+    required_columns = {"Resolution (s)", "Search Engine", "Time_s", "Power Mean", "Memory Mean"}
+    if not required_columns.issubset(binned_df.columns):
+        print("Time-binned DataFrame missing required columns for plots.")
         return
-    
-    # 1) Remove NaNs and negative values
-    sample_df = sample_df.dropna(subset=["Power (W)", "USED_MEMORY"])
-    sample_df = sample_df[sample_df["Power (W)"] >= 0].copy()
 
-    # 2) Compute time offset in seconds
-    sample_df["Time_s"] = (sample_df["Time"] - sample_df["Start_Time"]) / 1000.0
+    # 1) Mean power and memory per engine and 0.1 s time bin, averaged across all iterations
+    grouped = select_resolution(binned_df, 0.1)
 
-    # 3) (Optional) Bin the time offset if slight variations exist across iterations.
-    sample_df["Time_s_binned"] = sample_df["Time_s"].round(1)
-    
-    # 4) Group by Search Engine and binned time offset to average across all iterations for power
-    grouped_power = sample_df.groupby(["Search Engine", "Time_s_binned"], as_index=False).agg({
-        "Power (W)": "mean",
-        "Time_s": "mean"
-    })
-    
-    # 5) Remove any time offsets beyond 40 seconds for power plot
-    grouped_power = grouped_power[grouped_power["Time_s"] <= 40]
-    
-    # 6) Plot power with Seaborn
+    # 2) Remove any time offsets beyond 40 seconds
+    grouped = grouped[grouped["Time_s"] <= 40]
+    grouped_power = grouped.rename(columns={"Power Mean": "Power (W)"})
+    grouped_memory = grouped.rename(columns={"Memory Mean": "USED_MEMORY"})
+
+    # 3) Plot power with Seaborn
     plt.figure(figsize=(10, 6))
     sns.lineplot(data=grouped_power, x="Time_s", y="Power (W)", hue="Search Engine", marker="o")
     plt.title("Average Power Over Time (s) by Search Engine")
@@ -59,13 +66,7 @@ def plot_power_across_iterations(sample_df, output_path_power="results/plots/pow
     
     print(f"Saved power vs. time plot to {output_path_power}")
 
-    # 7) Group by Search Engine and binned time offset to average across all iterations for memory
-    grouped_memory = sample_df[sample_df["Time_s"] <= 40].groupby(["Search Engine", "Time_s_binned"], as_index=False).agg({
-        "USED_MEMORY": "mean",
-        "Time_s": "mean"
-    })
-    
-    # 8) Plot memory with Seaborn
+    # 5) Plot memory with Seaborn
     plt.figure(figsize=(10, 6))
     sns.lineplot(data=grouped_memory, x="Time_s", y="USED_MEMORY", hue="Search Engine", marker="o")
     plt.title("Average Used Memory Over Time (s) by Search Engine")
@@ -77,6 +78,43 @@ def plot_power_across_iterations(sample_df, output_path_power="results/plots/pow
     
     print(f"Saved memory vs. time plot to {output_path_memory}")
 
+def power_traces(sample_df, max_points=None):
+    """
+    Per-sample power (W) vs. time offset (s) of every iteration, for plot_power_traces.
+
+    `sample_df` is the per-sample export of process_energy. Each iteration's
+    trace is LTTB-downsampled to `max_points` points (default PLOT_POINTS),
+    so power spikes stay visible without plotting every sample.
+    """
+    columns = ["Search Engine", "Iteration", "Time_s", "Power (W)"]
+    if not {"Search Engine", "Iteration", "Time", "Start_Time", "Power (W)"}.issubset(sample_df.columns):
+        return pd.DataFrame(columns=columns)
+    power = sample_df["Power (W)"].to_numpy(dtype=float)
+    keep = ~pd.isna(power) & (power >= 0)
+    traces = pd.DataFrame({
+        "Search Engine": sample_df["Search Engine"].to_numpy()[keep],
+        "Iteration": sample_df["Iteration"].to_numpy()[keep],
+        "Time_s": (sample_df["Time"].to_numpy()[keep] - sample_df["Start_Time"].to_numpy()[keep]) / 1000.0,
+        "Power (W)": power[keep],
+    })
+    traces = traces[traces["Time_s"] <= 40]
+    max_points = PLOT_POINTS if max_points is None else max_points
+    return downsample_frame(traces, "Time_s", "Power (W)", ["Search Engine", "Iteration"], max_points).reset_index(drop=True)
+
+def plot_power_traces(trace_df, output_path="results/plots/power_traces.png"):
+    """Plots the power (W) trace of every iteration vs. time offset (s), one panel per search engine."""
+    if trace_df.empty:
+        print("No power samples to plot traces for.")
+        return
+    grid = sns.relplot(data=trace_df, x="Time_s", y="Power (W)", col="Search Engine", col_wrap=4,
+                       units="Iteration", estimator=None, kind="line", linewidth=0.5, alpha=0.5, height=3)
+    grid.set_axis_labels("Time (seconds)", "Power (W)")
+    grid.figure.suptitle("Power Over Time (s) per Iteration", y=1.02)
+    grid.savefig(output_path)
+    plt.close(grid.figure)
+
+    print(f"Saved power traces plot to {output_path}")
+
 def plot_avg_duration(df, output_path="results/plots/barplot_avg_duration.png"):
     """
     Plots the average duration (s) per search engine, averaged over all iterations.
@@ -155,10 +193,6 @@ def plot_response_time_vs_energy(df, output_path="results/plots/correlation_resp
     plt.close()
     print(f"Saved correlation plot to {output_path}")
 
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-
 def plot_percentage_changes(df_pct, output_path="results/plots/percentage_changes.png"):
     """
     Plots a grouped bar chart showing percentage change in various metrics per search engine.
@@ -231,70 +265,39 @@ def plot_selenium_energy(df):
     plt.savefig(os.path.join(SAVE_FIG_DIR, "barplot_selenium_metrics.png"))
     plt.close()
 
-def main():
-    ensure_dir(SAVE_FIG_DIR)
-    
-    # 1) Read the final energy results
-    df = pd.read_csv(FINAL_ENERGY_FILE)
-
-    # Parse the "Energy Delay Product" column (which is a list string like "[123.4, 567.8, 9012.3]")
-    edp_w1, edp_w2, edp_w3 = [], [], []
-    for edp_str in df["Energy Delay Product"]:
-        try:
-            edp_list = ast.literal_eval(str(edp_str))
-            edp_w1.append(edp_list[0] if len(edp_list) > 0 else None)
-            edp_w2.append(edp_list[1] if len(edp_list) > 1 else None)
-            edp_w3.append(edp_list[2] if len(edp_list) > 2 else None)
-        except:
-            edp_w1.append(None)
-            edp_w2.append(None)
-            edp_w3.append(None)
-    
-    df["EDP_w1"] = edp_w1
-    df["EDP_w2"] = edp_w2
-    df["EDP_w3"] = edp_w3
-    # ----------------------------------------------------------------
-    # 3) BAR PLOT OF AVERAGE TEMPERATURE (Celcius) PER SEARCH ENGINE (ALL ITERATIONS COMBINED)
+def plot_avg_temperature(df, output_path="results/plots/barplot_avg_temp.png"):
+    """Bar plot of the average temperature (Celcius) per search engine, all iterations combined."""
     plt.figure(figsize=(10, 6))
     sns.barplot(data=df.groupby("Search Engine", as_index=False)["Temperature"].mean(), x="Search Engine", y="Temperature")
     plt.title("Average Temperature (Celcius) per Search Engine")
     plt.ylabel("Temperature (Celcius)")
     plt.tight_layout()
-    plt.savefig(os.path.join(SAVE_FIG_DIR, "barplot_avg_temp.png"))
+    plt.savefig(output_path)
     plt.close()
-    # ----------------------------------------------------------------
-    # 1) BOX PLOT FOR EDP (w=1, w=2, w=3) IN SEPARATE FIGURES
-    #    Combine all iterations for each search engine 
-    for w_col, w_label in zip(["EDP_w1", "EDP_w2", "EDP_w3"], ["w=1", "w=2", "w=3"]):
-        plt.figure(figsize=(12, 5))
-        sns.boxplot(data=df, x="Search Engine", y=w_col)
-        plt.title(f"Energy Delay Product ({w_label}) per Search Engine")
-        plt.ylabel("EDP")
-        plt.tight_layout()
-        plt.savefig(os.path.join(SAVE_FIG_DIR, f"boxplot_edp_{w_label}.png"))
-        plt.close()
-    
-    # ----------------------------------------------------------------
-    # 2) VIOLIN PLOT OF TOTAL ENERGY (J) PER SEARCH ENGINE (ALL ITERATIONS COMBINED)
-    plt.figure(figsize=(22, 5))
-    sns.violinplot(data=df, x="Search Engine", y="Total Energy (J)", inner="box")
-    plt.title("Total Energy (J) per Search Engine")
+
+def plot_edp_boxplot(df, w_col, w_label, output_path):
+    """Box plot of one EDP weight per search engine, all iterations combined."""
+    plt.figure(figsize=(12, 5))
+    sns.boxplot(data=df, x="Search Engine", y=w_col)
+    plt.title(f"Energy Delay Product ({w_label}) per Search Engine")
+    plt.ylabel("EDP")
     plt.tight_layout()
-    plt.savefig(os.path.join(SAVE_FIG_DIR, "violin_total_energy.png"))
+    plt.savefig(output_path)
     plt.close()
-    
-    # ----------------------------------------------------------------
-    # 3) VIOLIN PLOT FOR AVERAGE POWER (W) PER SEARCH ENGINE (ALL ITERATIONS COMBINED)
+
+def plot_violin(df, y, title, output_path):
+    """Violin plot of `y` per search engine, all iterations combined."""
     plt.figure(figsize=(22, 5))
-    sns.violinplot(data=df, x="Search Engine", y="Average Power (W)", inner="box")
-    plt.title("Average Power (W) per Search Engine\n")
+    sns.violinplot(data=df, x="Search Engine", y=y, inner="box")
+    plt.title(title)
     plt.tight_layout()
-    plt.savefig(os.path.join(SAVE_FIG_DIR, "violin_avg_power.png"))
+    plt.savefig(output_path)
     plt.close()
-    
-    # ----------------------------------------------------------------
-    # 4) HISTOGRAM OF THE AVERAGE TOTAL ENERGY OVER ALL ITERATIONS PER SEARCH ENGINE
-    #    We'll group by search engine, compute the mean total energy, and plot a bar chart.
+
+def plot_avg_energy_histogram(df, output_path="results/plots/hist_avg_total_energy.png"):
+    """
+    Bar chart of the average total energy over all iterations per search engine.
+    """
     avg_energy_df = df.groupby("Search Engine", as_index=False)["Total Energy (J)"].mean()
     plt.figure(figsize=(14, 5))
     engines = avg_energy_df["Search Engine"].unique()
@@ -307,32 +310,172 @@ def main():
     plt.ylabel("Avg Total Energy (J)")
     plt.xlabel("Search Engine")
     plt.tight_layout()
-    plt.savefig(os.path.join(SAVE_FIG_DIR, "hist_avg_total_energy.png"))
+    plt.savefig(output_path)
     plt.close()
 
-    sample_df = pd.read_csv("results/final_energy_samples.csv")
-    
-    plot_avg_duration(df, output_path=os.path.join(SAVE_FIG_DIR, "barplot_avg_duration.png"))
+def figure_jobs(frames):
+    """
+    The figures drawn by main(), as render jobs.
+
+    Each job names the plot function, the `frames` it takes as positional
+    arguments, extra keyword arguments, its output files and the seaborn style
+    it is drawn in.
+    """
+    def job(name, func, frame_keys, outputs, style=None, **kwargs):
+        return {"name": name, "func": func, "frames": frame_keys, "kwargs": kwargs,
+                "outputs": outputs, "style": style}
+
+    def out(name):
+        return os.path.join(SAVE_FIG_DIR, name)
+
+    jobs = [job("barplot_avg_temp", plot_avg_temperature, ["results"], [out("barplot_avg_temp.png")],
+                output_path=out("barplot_avg_temp.png"))]
+    for w_col, w_label in zip(["EDP_w1", "EDP_w2", "EDP_w3"], ["w=1", "w=2", "w=3"]):
+        output = out(f"boxplot_edp_{w_label}.png")
+        jobs.append(job(f"boxplot_edp_{w_label}", plot_edp_boxplot, ["results"], [output],
+                        w_col=w_col, w_label=w_label, output_path=output))
+    jobs += [
+        job("violin_total_energy", plot_violin, ["results"], [out("violin_total_energy.png")],
+            y="Total Energy (J)", title="Total Energy (J) per Search Engine", output_path=out("violin_total_energy.png")),
+        job("violin_avg_power", plot_violin, ["results"], [out("violin_avg_power.png")],
+            y="Average Power (W)", title="Average Power (W) per Search Engine\n", output_path=out("violin_avg_power.png")),
+        job("hist_avg_total_energy", plot_avg_energy_histogram, ["results"], [out("hist_avg_total_energy.png")],
+            output_path=out("hist_avg_total_energy.png")),
+        job("barplot_avg_duration", plot_avg_duration, ["results"], [out("barplot_avg_duration.png")],
+            output_path=out("barplot_avg_duration.png")),
+        job("correlation_response_time_energy", plot_response_time_vs_energy, ["results"],
+            [out("correlation_response_time_energy.png")], output_path=out("correlation_response_time_energy.png")),
+        # The figures below were historically drawn after the correlation plot switched seaborn to whitegrid
+        job("aggregated_metrics", plot_power_across_iterations, ["time_bins"],
+            [out("aggregated_metrics.png"), out("memory_across_iterations.png")], style="whitegrid",
+            output_path_power=out("aggregated_metrics.png"), output_path_memory=out("memory_across_iterations.png")),
+        job("power_traces", plot_power_traces, ["traces"], [out("power_traces.png")], style="whitegrid",
+            output_path=out("power_traces.png")),
+        job("heatmaps", plot_pairwise_comparison_heatmaps, ["pairwise"],
+            [out(f"heatmap_{metric.replace(' ', '_')}.png") for metric in frames["pairwise"]["Metric"].unique()],
+            style="whitegrid", output_dir=SAVE_FIG_DIR),
+        job("barplot_selenium_metrics", plot_selenium_energy, ["timestamps"], [out("barplot_selenium_metrics.png")],
+            style="whitegrid"),
+    ]
+    return jobs
+
+def frame_hash(df):
+    """Content hash of a DataFrame's columns and values."""
+    digest = hashlib.blake2b(repr(list(df.columns)).encode(), digest_size=16)
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def job_hash(job, frame_hashes, source_hash):
+    """Hash of everything a figure depends on: its data, its arguments and the plotting source (see plot_source_hash)."""
+    spec = [job["func"].__name__, job["style"], sorted(job["kwargs"].items()), [frame_hashes[key] for key in job["frames"]],
+            source_hash]
+    return hashlib.blake2b(repr(spec).encode(), digest_size=16).hexdigest()
+
+def plot_source_hash():
+    """Hash of this file, the downsample and time_bins sources and PLOT_POINTS."""
+    spec = [file_hash(os.path.abspath(path)) for path in (__file__, downsample.__file__, time_bins.__file__)]
+    return hashlib.blake2b(repr([spec, PLOT_POINTS]).encode(), digest_size=16).hexdigest()
+
+def _init_worker(frames):
+    global _FRAMES
+    _FRAMES = frames
+    matplotlib.use("Agg")
 
-    plot_response_time_vs_energy(df, output_path=os.path.join(SAVE_FIG_DIR, "correlation_response_time_energy.png"))
+def _render_job(job):
+    """Draw one figure job with the shared frames; returns (name, error or None, wall s, CPU s)."""
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        plt.style.use("default")
+        if job["style"]:
+            sns.set(style=job["style"])
+        # Plot functions may add columns, so each job gets its own copy
+        args = [_FRAMES[key].copy() for key in job["frames"]]
+        job["func"](*args, **job["kwargs"])
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return job["name"], error, time.perf_counter() - wall, time.process_time() - cpu
+
+def render_figures(jobs, frames, workers=PLOT_WORKERS, render_all=RENDER_ALL):
+    """
+    Render the figure jobs whose inputs changed since the last run.
+
+    A job is skipped when its outputs exist and its hash (see job_hash) is
+    the one recorded in RENDER_STATE_FILE. The others are rendered in a
+    process pool on the Agg backend; the frames are handed to each worker once.
+    """
+    try:
+        with open(RENDER_STATE_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    frame_hashes = {key: frame_hash(df) for key, df in frames.items()}
+    source_hash = plot_source_hash()
+    hashes = {job["name"]: job_hash(job, frame_hashes, source_hash) for job in jobs}
+
+    todo = [job for job in jobs
+            if render_all or state.get(job["name"]) != hashes[job["name"]]
+            or not all(os.path.exists(path) for path in job["outputs"])]
+    log_message(f"Rendering {len(todo)} of {len(jobs)} figures ({len(jobs) - len(todo)} unchanged).")
+
+    workers = min(workers, len(todo))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(frames,)) as executor:
+            results = list(executor.map(_render_job, todo))
+    else:
+        _init_worker(frames)
+        results = [_render_job(job) for job in todo]
+
+    for name, error, wall_s, cpu_s in results:
+        # Timed inside the (worker) process that drew the figure
+        add_span(f"figure {name}", wall_s, cpu_s)
+        if error:
+            log_message(f"Error rendering {name}: {error}")
+        else:
+            state[name] = hashes[name]
+    with open(RENDER_STATE_FILE, "w") as f:
+        json.dump(state, f, indent=2)
+    return results
+
+def main():
+    ensure_dir(SAVE_FIG_DIR)
     
+    # 1) Read the final energy results
+    df = cached_load(FINAL_ENERGY_FILE)
+
+    # EDP_w1..3 are numeric columns; results written before they existed get them from energy and duration
+    df = with_edp_columns(df)
+
+    # 2) Load every input once; the rendering workers share these frames
+    with span("load inputs"):
+        sample_df = cached_load(SAMPLE_FILE) if os.path.exists(SAMPLE_FILE) else pd.DataFrame()
+        frames = {
+            "results": df,
+            # Precomputed by process_energy; older result folders only have the samples
+            "time_bins": (cached_load(TIME_BINS_FILE) if os.path.exists(TIME_BINS_FILE)
+                          else time_binned_aggregates(sample_df)),
+            # Downsampled here, so the rendering workers only receive the points that are drawn
+            "traces": power_traces(sample_df),
+            "pairwise": cached_load(PAIRWISE_RESULTS_FILE),
+            "timestamps": cached_load(TIMESTAMPS_FILE),
+        }
+    with span("render figures"):
+        results = render_figures(figure_jobs(frames), frames)
+
     efficiency_df = df.groupby("Search Engine", as_index=False)["Average Power (W)"].mean().sort_values("Average Power (W)")
     print("Average Power (W) per Search Engine:")
     print(efficiency_df)
     best_engine = efficiency_df.iloc[0]
     print(f"\nConclusion: The most energy efficient search engine is '{best_engine['Search Engine']}' "
           f"with an average power consumption of {best_engine['Average Power (W)']:.2f} W.")
-    
 
-    plot_power_across_iterations(sample_df, output_path_power="results/plots/aggregated_metrics.png", )
     log_message(f"Plots saved in: {SAVE_FIG_DIR}")
 
+    # The figures that rendered are kept; the stage still fails so it is not recorded as done
+    failed = [name for name, error, _, _ in results if error]
+    if failed:
+        raise RuntimeError(f"Failed to render {len(failed)} figures: {', '.join(failed)}")
 
-    df_comparision = pd.read_csv("results/pairwise_comparisons.csv")
-    plot_pairwise_comparison_heatmaps(df_comparision)
-
-    df = pd.read_csv(TIMESTAMPS_FILE)
-    plot_selenium_energy(df)
-    
 if __name__ == "__main__":
     main()
@@ -1,37 +1,67 @@
 import os
-from datetime import datetime
 
 import numpy as np
 import pandas as pd
-from scipy import stats
 import sys
 import re
-import matplotlib.pyplot as plt
 
-# File paths
-TIMESTAMPS_FILE = "search_engine_results/search_engine_timestamps.csv"
-ENERGY_LOG_FILE = "energy_log.csv"
-OUTPUT_FILE = "results/final_energy_results.csv"
-PAIRWISE_RESULTS_FILE = "results/pairwise_comparisons.csv"
-STAT_TEST_FILE = "results/statistical_tests.csv"
+from baseline_store import baseline_statistic, load_store
+from config import (DEFAULT_DURATION as wait_time, ENERGY_LOG_FILE, FINAL_ENERGY_FILE as OUTPUT_FILE,
+                    PAIRWISE_RESULTS_FILE, RESAMPLING_FILE, SAMPLE_FILE, STAT_TEST_FILE, TIMESTAMPS_FILE,
+                    TIME_BINS_FILE, lazy_import)
+from energy_cache import cached_load, store_cached
+from energy_engine import COUNTER_KEYS, COUNTER_WRAP_J, EnergyIndex, interval_metrics, temperature_columns
+from energy_io import DEFAULT_CHUNKSIZE, load_energy_log, stream_windows
+from idle_power import IDLE_MIN_REST_MS, IDLE_SETTLE_MS, REST_COLUMNS, idle_power, net_energy, rest_periods
+from incremental import (AGGREGATES_FILE, append_samples, load_aggregates, load_window_state,
+                         merge_window_results, save_window_state, select_new_windows, update_aggregates)
+from instrumentation import count, log_message, span
+from parallel_windows import parallel_windows
+from resampling import DEFAULT_RESAMPLES, resample_comparisons, with_edp_columns
+from stats_engine import METRICS, StatsEngine
+from time_bins import time_binned_aggregates
+
+stats = lazy_import("scipy.stats")
 
 BUFFER = int(os.getenv("INTERVAL", 200))  # Default to 200 if not set
+STREAM_CHUNKSIZE = int(os.getenv("STREAM_CHUNKSIZE", 0))  # Stream the energy log in chunks of this many rows (0 loads it in memory)
+WINDOW_WORKERS = int(os.getenv("WINDOW_WORKERS", 1))  # Processes computing the windows of the in-memory log (1 computes them here)
+# edp = energy_val * (duration_s ** w)
+# the exponent w denotes weights, and it can take the following values:
+#  1 for energy efficiency when energy is of major concern;
+#  2 for balanced, when both energy consumption and performance are important;
+#  3 for performance efficiency,
 W = [1,2,3]
-
-from measure import DEFAULT_DURATION as wait_time
-
-def log_message(message):
-    """Print a timestamped log message."""
-    print(f"[{datetime.now()}] {message}")
+# Columns and dtypes of the per-iteration results, with one EDP column per weight
+RESULTS_SCHEMA = {
+    "Search Engine": "str",
+    "Iteration": "int64",
+    "Total Energy (J)": "float64",
+    "Average Power (W)": "float64",
+    "Duration (s)": "float64",
+    **{f"EDP_w{w}": "float64" for w in W},
+    "Temperature": "float64",
+    # Above the idle power measured in the rest periods next to the window
+    "Idle Power (W)": "float64",
+    "Net Energy (J)": "float64",
+    "Net Average Power (W)": "float64",
+    **{f"Net EDP_w{w}": "float64" for w in W},
+}
+RESAMPLES = int(os.getenv("RESAMPLES", DEFAULT_RESAMPLES))  # Bootstrap/permutation resamples per pair (0 disables)
+RESAMPLE_WORKERS = int(os.getenv("RESAMPLE_WORKERS", 1))
+RESAMPLING_METRICS = ["Total Energy (J)", "Average Power (W)"] + [f"EDP_w{w}" for w in W]
+INCREMENTAL = os.getenv("INCREMENTAL", "0") != "0"  # Only compute windows that are new since the last run
+# mean, median or p<q> of the stored baseline iterations instead of the recorded average / 4 ("" keeps that)
+BASELINE_STATISTIC = os.getenv("BASELINE_STATISTIC", "")
+# Keep queries whose results measure never detected; their windows include up to 10 s of polling
+INCLUDE_UNDETECTED = os.getenv("INCLUDE_UNDETECTED", "0") != "0"
 
 def load_data(timestamps_file, energy_file):
     log_message(f"Loading timestamps from {timestamps_file}")
-    timestamps_df = pd.read_csv(timestamps_file)
+    timestamps_df = cached_load(timestamps_file)
     
     log_message(f"Loading energy log from {energy_file}")
-    energy_df = pd.read_csv(energy_file)
-    
-    energy_df["Time"] = pd.to_numeric(energy_df["Time"])
+    energy_df = cached_load(energy_file, load_energy_log)
 
     return timestamps_df, energy_df
 
@@ -39,134 +69,200 @@ def remove_outliers_zscore(samples, threshold=3):
     z_scores = np.abs(stats.zscore(samples))
     return samples[z_scores < threshold]
 
-def compute_energy_for_interval(subframe, key="PACKAGE_ENERGY (W)"):
-    avg_temp = None
-    if "CPU_ENERGY (J)" in subframe.columns:
-            key = "CPU_ENERGY (J)"
-    if "PACKAGE_ENERGY (J)" in subframe.columns:
-            key = "PACKAGE_ENERGY (J)"
-    if "SYSTEM_POWER (Watts)" in subframe.columns:
-            key = "SYSTEM_POWER (Watts)"
-    data = subframe[key].copy().to_list()
-
-    if key != "CPU_POWER (Watts)" and key != "SYSTEM_POWER (Watts)":
+def compute_energy_for_interval(subframe, key=None):
+    """
+    Compute total energy, average power and temperature for one window.
+
+    The energy/power column is auto-detected unless `key` is given. Returns the
+    subframe with a "Power (W)" column derived from the cumulative counters.
+    """
+    total_energy, avg_power, avg_temp, power, key = interval_metrics(subframe, key)
+
+    if key in COUNTER_KEYS:
         subframe = subframe.copy()
-        subframe.loc[:, key + "_original"] = subframe[key].copy()
-
-
-        for i in range(1, len(subframe)):
-            # Power is delta energy / delta time
-            delta_e = subframe[key].iloc[i] - subframe[key].iloc[i - 1]
-            delta_t = subframe["Delta"].iloc[i]
-            if not np.isnan(delta_t) and delta_t > 0:
-                subframe.loc[subframe.index[i], "Power (W)"] = (delta_e * 1000) / delta_t
-            else:
-                subframe.loc[subframe.index[i], "Power (W)"] = 0
-
-    if key == "SYSTEM_POWER (Watts)":
-        all_temps = subframe[['CPU_TEMP_0','CPU_TEMP_1','CPU_TEMP_2','CPU_TEMP_3',
-                           'CPU_TEMP_4','CPU_TEMP_5','CPU_TEMP_6','CPU_TEMP_7',
-                           'CPU_TEMP_8','CPU_TEMP_9']]
-        avg_temp = all_temps.mean(axis=0).mean()
-
-        times_s = subframe["Time"].values / 1000.0
-        total_energy = np.trapz(data, times_s)  if len(times_s) > 1 else 0.0
-    if key == "PACKAGE_ENERGY (J)":
-        total_energy = subframe[key].iloc[-1] - subframe[key].iloc[0]
+        subframe[key + "_original"] = subframe[key]
+        subframe["Power (W)"] = power
     print(f"Total energy: {total_energy}")
-    avg_power = 0
-    if key == "SYSTEM_POWER (Watts)":
-        avg_power = subframe["SYSTEM_POWER (Watts)"].mean()
-        return total_energy, avg_power, avg_temp, subframe
-    avg_power = subframe["Power (W)"].mean()
-    print(f"Average power: {avg_power}") 
+    print(f"Average power: {avg_power}")
 
     return total_energy, avg_power, avg_temp, subframe
 
-def calculate_energy_consumption(timestamps_df, energy_df):
+def prepare_timestamps(timestamps_df, baseline_overheads=None):
+    """
+    Remove the wait after each query from its window and scale the baseline overhead.
+
+    With `baseline_overheads` ({engine: ms}, see baseline_store.baseline_statistic)
+    those replace the scaled overhead of the engines they cover. Also adds
+    the REST_COLUMNS bounds of the rest periods around each query, taken from
+    the whole campaign so a subset of rows keeps them. Queries whose results
+    were not detected ("Results Detected" is False) are then dropped, unless
+    INCLUDE_UNDETECTED is set.
+    """
+    timestamps_df["End Time"] -= wait_time * 1000
+    timestamps_df["Baseline Overhead (ms)"] /= 4
+    if baseline_overheads:
+        stored = timestamps_df["Search Engine"].map(baseline_overheads).astype(float)
+        timestamps_df["Baseline Overhead (ms)"] = stored.fillna(timestamps_df["Baseline Overhead (ms)"])
+    timestamps_df["Normalized Duration (ms)"] = (timestamps_df["End Time"] - timestamps_df["Start Time"]) - timestamps_df["Baseline Overhead (ms)"]
+    rests = rest_periods(timestamps_df["Start Time"], timestamps_df["End Time"], wait_time * 1000)
+    for i, column in enumerate(REST_COLUMNS):
+        timestamps_df[column] = rests[:, i]
+    if "Results Detected" in timestamps_df.columns and not INCLUDE_UNDETECTED:
+        # Older timestamp files have no flag; their queries are kept
+        detected = timestamps_df["Results Detected"].astype(str) != "False"
+        if not detected.all():
+            log_message(f"Leaving out {(~detected).sum()} queries whose results were not detected.")
+            count("undetected_results", int((~detected).sum()))
+        timestamps_df = timestamps_df[detected].reset_index(drop=True)
+    return timestamps_df
+
+def window_bounds(timestamps_df):
+    """
+    Start and end time (ms) of each query window in timestamps_df.
+
+    If a query took more than 1 second beyond the baseline, the baseline
+    overhead (probably due to selenium) is removed from the start.
+    """
+    start_times = np.where(timestamps_df["Normalized Duration (ms)"] > 1000,
+                           timestamps_df["Start Time"] + timestamps_df["Baseline Overhead (ms)"],
+                           timestamps_df["Start Time"]).astype(np.int64)
+    end_times = timestamps_df["End Time"].to_numpy(dtype=np.int64)
+    return start_times, end_times
+
+def window_queries(timestamps_df):
+    """
+    Windows to resolve for timestamps_df in one pass over the energy log.
+
+    Returns (start_times, end_times, starts, ends): the query windows, and
+    the bounds of the n buffered query windows followed by the n rest
+    periods before and the n rest periods after them.
+    """
+    start_times, end_times = window_bounds(timestamps_df)
+    rests = timestamps_df[REST_COLUMNS].to_numpy(dtype=np.int64)
+    starts = np.concatenate([start_times - BUFFER, rests[:, 0], rests[:, 2]])
+    ends = np.concatenate([end_times + BUFFER, rests[:, 1], rests[:, 3]])
+    return start_times, end_times, starts, ends
+
+def split_rest_windows(windows, n):
+    """Metrics of the n query windows from the windows of window_queries, with their idle power."""
+    query_windows = {name: value[:n] if value is not None else None for name, value in windows.items()}
+    power = windows["Average Power (W)"]
+    query_windows["Idle Power (W)"] = idle_power(power[n:2 * n], power[2 * n:])
+    return query_windows
+
+def calculate_energy_consumption(timestamps_df, energy_df, index=None):
     log_message("Calculating energy consumption per iteration.")
-    results = []
-    sample_rows = []
-    sample_data = pd.DataFrame()
+    # Resolve all [start - BUFFER, end + BUFFER] windows and rest periods in one batched index query
+    index = index if index is not None else EnergyIndex(energy_df)
+    start_times, end_times, starts, ends = window_queries(timestamps_df)
+    count("windows", len(timestamps_df))
+    count("rows", len(index))
+    windows = split_rest_windows(index.query(starts, ends), len(timestamps_df))
+    samples = index.window_samples(windows["lo"], windows["hi"])
+
+    return build_results(timestamps_df, start_times, end_times, windows, samples)
+
+def calculate_energy_consumption_streaming(timestamps_df, energy_file, chunksize=DEFAULT_CHUNKSIZE):
+    """Same as calculate_energy_consumption, but streams energy_file in chunks of `chunksize` rows."""
+    log_message(f"Calculating energy consumption per iteration, streaming {energy_file}.")
+    start_times, end_times, starts, ends = window_queries(timestamps_df)
+    count("windows", len(timestamps_df))
+    keep = np.arange(len(starts)) < len(timestamps_df)
+    windows, samples = stream_windows(energy_file, starts, ends, chunksize, keep_samples=keep)
+
+    return build_results(timestamps_df, start_times, end_times, split_rest_windows(windows, len(timestamps_df)), samples)
+
+def calculate_energy_consumption_parallel(timestamps_df, energy_df, workers=WINDOW_WORKERS):
+    """Same as calculate_energy_consumption, with the windows split by time range over `workers` processes."""
+    log_message(f"Calculating energy consumption per iteration in {workers} processes.")
+    start_times, end_times, starts, ends = window_queries(timestamps_df)
+    count("windows", len(timestamps_df))
+    count("rows", len(energy_df))
+    keep = np.arange(len(starts)) < len(timestamps_df)
+    windows, samples = parallel_windows(energy_df, starts, ends, workers, keep_samples=keep)
+
+    return build_results(timestamps_df, start_times, end_times, split_rest_windows(windows, len(timestamps_df)), samples)
+
+def export_samples(timestamps_df, start_times, samples, sample_windows):
+    """
+    Label the samples of all windows with their engine, iteration and start time.
 
-    for idx, row in timestamps_df.iterrows():
-        engine = row["Search Engine"]
-        normalized_duration = row["Normalized Duration (ms)"]
+    `sample_windows` holds the timestamps_df position of each sample's window,
+    so the export is built by column slicing instead of per-sample rows.
+    """
+    if samples.empty:
+        return pd.DataFrame()
+    sample_results_df = pd.DataFrame({
+        "Search Engine": timestamps_df["Search Engine"].to_numpy()[sample_windows],
+        "Iteration": timestamps_df["Iteration"].to_numpy()[sample_windows],
+        "Time": samples["Time"].to_numpy(),
+        "Start_Time": start_times[sample_windows],
+        "Power (W)": samples["Power (W)"].to_numpy(),
+    })
+    extra_columns = ["CPU_USAGE"] if "CPU_USAGE" in samples.columns else []
+    extra_columns += temperature_columns(samples.columns)
+    if "USED_MEMORY" in samples.columns and "TOTAL_MEMORY" in samples.columns:
+        extra_columns += ["USED_MEMORY", "TOTAL_MEMORY"]
+    for col in extra_columns:
+        sample_results_df[col] = samples[col].to_numpy()
+    return sample_results_df
+
+def typed_results(results_df):
+    """
+    Per-iteration results in RESULTS_SCHEMA column order and dtypes.
+
+    Adds the EDP_w<w> and Net EDP_w<w> columns; an "Energy Delay Product"
+    list column from older result files is dropped.
+    """
+    results_df = with_edp_columns(results_df.drop(columns=["Energy Delay Product"], errors="ignore"), W)
+    if "Net Energy (J)" in results_df.columns:
+        results_df = with_edp_columns(results_df, W, "Net Energy (J)", "Net EDP_w")
+    return results_df.reindex(columns=list(RESULTS_SCHEMA)).astype(RESULTS_SCHEMA)
+
+def build_results(timestamps_df, start_times, end_times, windows, samples):
+    """Assemble the per-iteration results and the per-sample export from resolved windows."""
+    results = []
 
-        # if query took 1 second more than the baseline remove this overhead probably due to selenium.
-        start_time = int(row["Start Time"] + row['Baseline Overhead (ms)']) if normalized_duration > 1000 else int(row["Start Time"])
-        # start_time = row['Start Time']
-        end_time = row["End Time"]
+    for i, (engine, iteration) in enumerate(zip(timestamps_df["Search Engine"], timestamps_df["Iteration"])):
+        start_time, end_time = start_times[i], end_times[i]
         print(f"Start time: {start_time}, end time: {end_time} {end_time - start_time}")
 
         if start_time > end_time:
             print("Start time is greater than end time. Skipping this iteration.")
 
-        iteration = row["Iteration"]
-        buffer_ms = BUFFER
-        
-        iter_df = energy_df[(energy_df["Time"] >= (start_time - buffer_ms)) &
-                         (energy_df["Time"] <= (end_time + buffer_ms))]
-        if iter_df.empty:
+        if windows["Samples"][i] == 0:
             log_message(f"Warning: No energy data for {engine} Iteration {iteration}")
             res = {"Search Engine": engine, "Iteration": iteration,
-                   "Total Energy (J)": 0, "Average Power (W)": 0, "Duration (s)": 0,
-                   "Energy Delay Product": 0
+                   "Total Energy (J)": 0, "Average Power (W)": 0, "Duration (s)": 0
                    }
         else:
-            energy_val, avg_power, avg_temp, sample_data = compute_energy_for_interval(iter_df)
+            energy_val = windows["Total Energy (J)"][i]
+            avg_power = windows["Average Power (W)"][i]
+            avg_temp = windows["Temperature"][i] if windows["Temperature"] is not None else None
             duration_s = (end_time - start_time) / 1000.0
-            
-            # edp = energy_val * (duration_s ** w)
-            # the exponent w denotes weights, and it can take the following values:
-            #  1 for energy efficiency when energy is of major concern;
-            #  2 for balanced, when both energy consumption and performance are important;
-            #  3 for performance efficiency,
-            edp1, edp2, edp3 = (energy_val * duration_s ** w for w in W)
+            idle = windows["Idle Power (W)"][i]
+            net_energy_val, net_power = net_energy(energy_val, avg_power, windows["Span (s)"][i], idle)
 
             res = {"Search Engine": engine, "Iteration": iteration,
                    "Total Energy (J)": energy_val,
                    "Average Power (W)": avg_power,
                    "Duration (s)": duration_s,
-                   "Energy Delay Product": [edp1, edp2, edp3],
-                   "Temperature": avg_temp
+                   "Temperature": avg_temp,
+                   "Idle Power (W)": idle,
+                   "Net Energy (J)": net_energy_val,
+                   "Net Average Power (W)": net_power
                    }
-        # print(sample_data.columns)
-        if sample_data.empty:
-            log_message(f"Warning: No sample data for {engine} Iteration {iteration}")
-        else:
-            for i, r in sample_data.iterrows():
-                sample_row = {
-                    "Search Engine": engine,
-                    "Iteration": iteration,
-                    "Time": r["Time"],
-                    "Start_Time": start_time,
-                    "Power (W)": r.get("SYSTEM_POWER (Watts)", r.get("Power (W)", None))
-                }
-                if "CPU_USAGE" in r:
-                    sample_row["CPU_USAGE"] = r["CPU_USAGE"]
-                for col in r.index:
-                    if "CPU_TEMP" in col:
-                        sample_row[col] = r[col]
-                if "USED_MEMORY" in r and "TOTAL_MEMORY" in r:
-                    sample_row["USED_MEMORY"] = r["USED_MEMORY"]
-                    sample_row["TOTAL_MEMORY"] = r["TOTAL_MEMORY"]
-                        
-                sample_rows.append(sample_row)
-    
         results.append(res)
-    iter_results_df = pd.DataFrame(results)
-    sample_results_df = pd.DataFrame(sample_rows)
+    iter_results_df = typed_results(pd.DataFrame(results))
+    sample_results_df = export_samples(timestamps_df, start_times, *samples)
     
     return iter_results_df, sample_results_df
 
-def statistical_tests(results_df):
+def statistical_tests(results_df, stats_engine=None):
     """
     For each search engine's 'Total Energy (J)' and 'Average Power (W)' values,
     perform a Shapiro–Wilk test for normality. If a group's p-value is below 0.05,
-    remove outliers (using a z-score filter) and retest.
-    
-    Prints the initial and filtered test statistics and p-values.
+    remove outliers (using an IQR filter) and retest.
     
     Returns:
       - normality_details: dict keyed by metric, where each value is a dict mapping
@@ -175,182 +271,128 @@ def statistical_tests(results_df):
            and 'is_normal' (boolean, or None if not enough data).
       - overall_normal: dict keyed by metric with an overall flag (True if all groups are normal, False otherwise).
     """
-    import numpy as np
-    from scipy import stats
-    
+    stats_engine = stats_engine or StatsEngine(results_df)
+    log_message("Performing Shapiro-Wilk tests for normality...")
     normality_details = {}
     overall_normal = {}
-    metrics = ["Total Energy (J)", "Average Power (W)"]
-    log_message("Performing Shapiro-Wilk tests for normality...")
-    for metric in metrics:
-        metric_details = {}
-        all_normal = True
-        for engine in results_df["Search Engine"].unique():
-            print()
-            na_values = results_df[results_df["Search Engine"] == engine][metric][results_df[results_df["Search Engine"] == engine][metric].isna()]
-            print(f"NaN values for {engine} - {metric}: {na_values}")
-            values = results_df[results_df["Search Engine"] == engine][metric].dropna().values
-            # print(f"{engine} - {metric}: {len(values)} values {values}") 
-            detail = {}
-            if len(values) < 3:
-                detail["initial_stat"] = None
-                detail["initial_p"] = None
-                detail["filtered_stat"] = None
-                detail["filtered_p"] = None
-                detail["is_normal"] = None  # Not enough data to assess normality
-                metric_details[engine] = detail
-                continue
-            
-            # Perform initial Shapiro–Wilk test
-            stat, p = stats.shapiro(values)
-            detail["initial_stat"] = stat
-            detail["initial_p"] = p
-            log_message(f"{engine} - {metric} (initial): stat={stat:.4f}, p={p:.4f}")
-            
-            if p < 0.05:
-                # Remove outliers and retest
-                def remove_outliers_iqr(values, df, col, engine):
-                    Q1 = df[col].quantile(0.25)
-                    Q3 = df[col].quantile(0.75)
-                    IQR = Q3 - Q1
-                  
-
-                    outliers = values[(values < Q1 - 1.5 * IQR) | (values > Q3 + 1.5 * IQR)]
-                    final = values[~np.in1d(values, outliers)]
-                    return final
-                filtered_values = remove_outliers_iqr(values, results_df[results_df["Search Engine"] == engine], metric, engine)
-                if len(filtered_values) < 3:
-                    detail["filtered_stat"] = None
-                    detail["filtered_p"] = None
-                    detail["is_normal"] = False
-                    all_normal = False
-                    log_message(f"{engine} - {metric}: Not enough data after outlier removal.")
-                else:
-                    stat2, p2 = stats.shapiro(filtered_values)
-                    detail["filtered_stat"] = stat2
-                    detail["filtered_p"] = p2
-                    log_message(f"{engine} - {metric} (filtered): stat={stat2:.4f}, p={p2:.4f}")
-                    if p2 < 0.05:
-                        detail["is_normal"] = False
-                        all_normal = False
-                        log_message(f"{engine} - {metric}: Data is non-normal even after outlier removal.")
-                    else:
-                        detail["is_normal"] = True
-                        log_message(f"{engine} - {metric}: Data is normal after outlier removal.")
-            else:
-                detail["filtered_stat"] = None
-                detail["filtered_p"] = None
-                detail["is_normal"] = True
-                log_message(f"{engine} - {metric}: Data is normal.")
-            metric_details[engine] = detail
-        normality_details[metric] = metric_details
-        overall_normal[metric] = all_normal
+    for metric in METRICS:
+        normality_details[metric], overall_normal[metric] = stats_engine.normality(metric)
     return normality_details, overall_normal
 
-def pairwise_comparisons_metric(results_df, metric, normality_details, is_normal=True):
+def pairwise_comparisons_metric(results_df, metric, normality_details=None, stats_engine=None):
     """
     For each pair of search engines, perform a pairwise statistical test on the given metric.
     
-    If is_normal is True, use Welch's t-test and compute Cohen's d as effect size.
-    Otherwise, use the Mann–Whitney U test and compute an effect size based on rank-biserial correlation.
+    If both engines are normal, use Welch's t-test and compute Cohen's d as effect size.
+    Otherwise, use the Mann–Whitney U test and use U / (n1 * n2) as effect size.
+    Each unordered pair is tested once and mirrored.
     
     Returns:
       A DataFrame containing the pairwise comparison results for the specified metric.
     """
-
-
-    engines = results_df["Search Engine"].unique()
-    comp_results = []
-    for i in range(len(engines)):
-        for j in range(len(engines)):
-            engA = engines[i]
-            engB = engines[j]
-           
-                    
-            dataA = results_df[results_df["Search Engine"] == engA][metric]
-            dataB = results_df[results_df["Search Engine"] == engB][metric]
-            # Print NaN values for both engines
-            nan_values_A = dataA[dataA.isna()]
-            nan_values_B = dataB[dataB.isna()]
-            
-            if not nan_values_A.empty:
-                print(f"NaN values for {engA}: {nan_values_A}")
-            if not nan_values_B.empty:
-                print(f"NaN values for {engB}: {nan_values_B}")
-            dataA = dataA.dropna()
-            dataB = dataB.dropna()
-            if len(dataA) < 2 or len(dataB) < 2:
-                print(f"Not enough data for {engA} vs. {engB}")
-                continue
-            
-            is_normal_A = normality_details[metric][engA]["is_normal"]
-            is_normal_B = normality_details[metric][engB]["is_normal"]
-            is_normal = (is_normal_A is True) and (is_normal_B is True)
-            
-            if is_normal:
-                # Welch's t-test
-                t_stat, p_val = stats.ttest_ind(dataA, dataB, equal_var=False)
-                test_used = "Welch t-test"
-                # Cohen's d using pooled standard deviation
-                stdA, stdB = dataA.std(ddof=1), dataB.std(ddof=1)
-                pooled_std = np.sqrt((stdA**2 + stdB**2) / 2)
-                cohens_d = (dataA.mean() - dataB.mean()) / pooled_std if pooled_std > 0 else np.nan
-                effect_size = cohens_d
-            else:
-                # Mann-Whitney U test
-                u_stat, p_val = stats.mannwhitneyu(dataA, dataB, alternative='two-sided')
-                test_used = "Mann-Whitney U"
-                # Common effect size as in lectures:
-                n1, n2 = len(dataA), len(dataB)
-                effect_size = u_stat / (n1 * n2)
-            
-            pct_change = ((dataB.mean() - dataA.mean()) / dataA.mean() * 100) if dataA.mean() != 0 else np.nan
-            # print(f"{engA} vs. {engB}: stat={effect_size:.4f}, p={p_val:.4f}, pct change={pct_change:.2f}%")
-            comp_results.append({
-                "Metric": metric,
-                "Engine A": engA,
-                "Engine B": engB,
-                "Mean A": dataA.mean(),
-                "Mean B": dataB.mean(),
-                "Test Used": test_used,
-                "Statistic": t_stat if is_normal else u_stat,
-                "p-value": p_val,
-                "Effect Size (Cohen's d)" if is_normal else "Effect Size (non normal)": effect_size,
-                "Percentage Change (%)": pct_change
-            })
-    
-    # For consistent column naming, we rename the effect size field:
-    comp_df = pd.DataFrame(comp_results)
-    if is_normal:
-        comp_df = comp_df.rename(columns={"Effect Size (Cohen's d)": "Effect Size"})
-    else:
-        comp_df = comp_df.rename(columns={"Effect Size (Rank-Biserial)": "Effect Size"})
-    
-    return comp_df
+    stats_engine = stats_engine or StatsEngine(results_df)
+    return stats_engine.pairwise(metric, normality_details)
 
 def save_results(results_df, output_file):
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     results_df.to_csv(output_file, index=False)
+    # Binary columnar copy, so cached_load(output_file) reads it without parsing
+    store_cached(results_df, output_file)
     log_message(f"Results saved to {output_file}")
 
+def compute_windows(timestamps_df):
+    """Per-iteration results and samples of timestamps_df, streamed or from the in-memory log."""
+    if STREAM_CHUNKSIZE > 0:
+        return calculate_energy_consumption_streaming(timestamps_df, ENERGY_LOG_FILE, STREAM_CHUNKSIZE)
+    log_message(f"Loading energy log from {ENERGY_LOG_FILE}")
+    energy_df = cached_load(ENERGY_LOG_FILE, load_energy_log)
+    if WINDOW_WORKERS > 1:
+        return calculate_energy_consumption_parallel(timestamps_df, energy_df)
+    return calculate_energy_consumption(timestamps_df, energy_df)
+
+def window_settings(baseline_overheads=None):
+    """Settings besides BUFFER that change the per-window results; saved windows are only reused if they match."""
+    return {
+        "COUNTER_WRAP_J": COUNTER_WRAP_J,
+        "IDLE_SETTLE_MS": IDLE_SETTLE_MS,
+        "IDLE_MIN_REST_MS": IDLE_MIN_REST_MS,
+        "BASELINE_STATISTIC": BASELINE_STATISTIC,
+        "INCLUDE_UNDETECTED": INCLUDE_UNDETECTED,
+        # The overheads taken from the baseline store, so a new baseline run also invalidates the windows
+        "Baseline Overheads": {engine: float(ms) for engine, ms in (baseline_overheads or {}).items()},
+    }
+
+def update_window_results(timestamps_df, baseline_overheads=None):
+    """
+    Compute the windows that are not in the saved window state and merge them in.
+
+    Without INCREMENTAL every window is computed. The saved state is only
+    used if it was computed with the same window_settings on an energy log
+    that has at most been appended to. Returns (iter_results_df,
+    sample_results_df, changed_engines): sample_results_df is None if the new
+    samples were appended to SAMPLE_FILE, changed_engines is None if nothing
+    was reused.
+    """
+    settings = window_settings(baseline_overheads)
+    state = load_window_state(BUFFER, settings, ENERGY_LOG_FILE) if INCREMENTAL else None
+    if INCREMENTAL and state is None:
+        log_message("No reusable window state (first run, other settings or a rewritten energy log).")
+    new_timestamps_df = select_new_windows(timestamps_df, state)
+    log_message(f"{len(new_timestamps_df)} of {len(timestamps_df)} windows to compute.")
+
+    if new_timestamps_df.empty:
+        new_results_df, sample_results_df = pd.DataFrame(), pd.DataFrame()
+    else:
+        new_results_df, sample_results_df = compute_windows(new_timestamps_df.reset_index(drop=True))
+    iter_results_df, state = merge_window_results(state if INCREMENTAL else None, new_timestamps_df,
+                                                  new_results_df, timestamps_df, BUFFER)
+    iter_results_df = typed_results(iter_results_df)
+    save_window_state(state, settings, ENERGY_LOG_FILE)
+
+    if INCREMENTAL and len(new_timestamps_df) < len(timestamps_df):
+        append_samples(sample_results_df, SAMPLE_FILE)
+        sample_results_df = None
+        aggregates_df = load_aggregates() if new_results_df.empty else update_aggregates(load_aggregates(), new_results_df)
+        changed_engines = set(new_timestamps_df["Search Engine"])
+    else:
+        save_results(sample_results_df, SAMPLE_FILE)
+        aggregates_df = update_aggregates(None, iter_results_df)
+        changed_engines = None
+    if aggregates_df is not None:
+        save_results(aggregates_df, AGGREGATES_FILE)
+    return iter_results_df, sample_results_df, changed_engines
+
 def main():
     log_message("Starting energy analysis with iterations.")
     try:
-        timestamps_df, energy_df = load_data(TIMESTAMPS_FILE, ENERGY_LOG_FILE)
-        timestamps_df["End Time"] -= wait_time * 1000
-        timestamps_df["Baseline Overhead (ms)"] /= 4
-        timestamps_df["Normalized Duration (ms)"] = (timestamps_df["End Time"] - timestamps_df["Start Time"]) - timestamps_df["Baseline Overhead (ms)"]
-
-        save_results(timestamps_df, "results/test_time.csv")
-
-        iter_results_df, sample_results_df = calculate_energy_consumption(timestamps_df, energy_df)
-        save_results(iter_results_df, OUTPUT_FILE)
-
-        sample_file = "results/final_energy_samples.csv"
-        save_results(sample_results_df, sample_file)
-
-
-        normality_details, overall_normal = statistical_tests(iter_results_df)
+        log_message(f"Loading timestamps from {TIMESTAMPS_FILE}")
+        with span("load timestamps"):
+            baseline_overheads = None
+            if BASELINE_STATISTIC:
+                baseline_overheads = baseline_statistic(load_store(), BASELINE_STATISTIC)
+                log_message(f"Baseline overheads ({BASELINE_STATISTIC} of the stored iterations): {baseline_overheads}")
+            timestamps_df = prepare_timestamps(cached_load(TIMESTAMPS_FILE), baseline_overheads)
+
+            save_results(timestamps_df, "results/test_time.csv")
+
+        with span("energy per window"):
+            iter_results_df, sample_results_df, changed_engines = update_window_results(timestamps_df, baseline_overheads)
+            save_results(iter_results_df, OUTPUT_FILE)
+
+        # Per (engine, time bin) power and memory summaries for the time-series plots
+        with span("time bins"):
+            if sample_results_df is None:
+                sample_results_df = cached_load(SAMPLE_FILE)
+            count("samples", len(sample_results_df))
+            save_results(time_binned_aggregates(sample_results_df), TIME_BINS_FILE)
+
+        stats_engine = StatsEngine(iter_results_df)
+        if changed_engines is not None and os.path.exists(STAT_TEST_FILE) and os.path.exists(PAIRWISE_RESULTS_FILE):
+            # Tests that only involve unchanged engines are read back instead of recomputed
+            stats_engine.preload(set(stats_engine.engines) - changed_engines,
+                                 pd.read_csv(STAT_TEST_FILE), pd.read_csv(PAIRWISE_RESULTS_FILE))
+        with span("normality tests"):
+            normality_details, overall_normal = statistical_tests(iter_results_df, stats_engine)
         
         norm_rows = []
         for metric, engine_details in normality_details.items():
@@ -367,20 +409,28 @@ def main():
         norm_df = pd.DataFrame(norm_rows)
         save_results(norm_df, STAT_TEST_FILE)
         print(overall_normal)
-        normality_details, overall_normal = statistical_tests(iter_results_df)
-        pairwise_energy = pairwise_comparisons_metric(iter_results_df, "Total Energy (J)", normality_details)
-        pairwise_power = pairwise_comparisons_metric(iter_results_df, "Average Power (W)", normality_details)
+        with span("pairwise comparisons"):
+            pairwise_energy = pairwise_comparisons_metric(iter_results_df, "Total Energy (J)", stats_engine=stats_engine)
+            pairwise_power = pairwise_comparisons_metric(iter_results_df, "Average Power (W)", stats_engine=stats_engine)
 
 
         combined_pairwise = pd.concat([pairwise_energy, pairwise_power], ignore_index=True)
         save_results(combined_pairwise, PAIRWISE_RESULTS_FILE)
 
+        if RESAMPLES > 0:
+            log_message(f"Computing bootstrap CIs and permutation tests ({RESAMPLES} resamples)...")
+            with span("resampling", resamples=RESAMPLES):
+                resampling_df = resample_comparisons(stats_engine, RESAMPLING_METRICS, RESAMPLES, workers=RESAMPLE_WORKERS)
+            save_results(resampling_df, RESAMPLING_FILE)
+
         log_message("Analysis complete!")
         
     except FileNotFoundError as e:
         log_message(f"Error: Required file not found - {e}")
+        raise
     except Exception as e:
         log_message(f"Unexpected error: {e}")
+        raise
 
 if __name__ == "__main__":
     main()
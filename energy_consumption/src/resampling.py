@@ -0,0 +1,141 @@
+"""
+Vectorized bootstrap and permutation tests for engine comparisons.
+
+Bootstrap confidence intervals and permutation p-values are computed from
+index matrices drawn in batches, so every resample of every engine pair is a
+NumPy broadcast rather than a Python loop. Engine pairs can optionally be
+spread over a process pool.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RESAMPLES = 10_000
+BATCH_SIZE = 1_000  # resamples per index matrix
+PAIRS_PER_TASK = 8  # engine pairs per permutation task; fixed so results do not depend on the worker count
+
+
+def with_edp_columns(results_df, weights=(1, 2, 3), energy_column="Total Energy (J)", prefix="EDP_w"):
+    """Add numeric <prefix><w> = energy * duration ** w columns if they are missing."""
+    missing = {f"{prefix}{w}": w for w in weights if f"{prefix}{w}" not in results_df.columns}
+    if not missing:
+        return results_df
+    results_df = results_df.copy()
+    for col, w in missing.items():
+        results_df[col] = results_df[energy_column] * results_df["Duration (s)"] ** w
+    return results_df
+
+
+def bootstrap_means(values, n_resamples, rng, batch_size=BATCH_SIZE):
+    """Bootstrap distribution (n_resamples,) of the mean of `values`."""
+    means = np.empty(n_resamples)
+    for start in range(0, n_resamples, batch_size):
+        stop = min(start + batch_size, n_resamples)
+        idx = rng.integers(0, len(values), size=(stop - start, len(values)))
+        means[start:stop] = values[idx].mean(axis=1)
+    return means
+
+
+def permutation_pvalues(pooled, n_a, n_resamples, seed, batch_size=BATCH_SIZE):
+    """
+    Two-sided permutation p-values for the difference in means of many pairs.
+
+    `pooled` is a (pairs, n_a + n_b) array whose first n_a columns are group A.
+    Every batch draws one permutation index matrix shared by all pairs.
+    """
+    rng = np.random.default_rng(seed)
+    n = pooled.shape[1]
+    n_b = n - n_a
+    totals = pooled.sum(axis=1, keepdims=True)
+    observed = np.abs(pooled[:, :n_a].mean(axis=1) - pooled[:, n_a:].mean(axis=1))
+    # Tolerance so permutations equal to the observed split count as extreme
+    threshold = observed[:, None] * (1 - 1e-9)
+    extreme = np.zeros(len(pooled))
+    for start in range(0, n_resamples, batch_size):
+        size = min(batch_size, n_resamples - start)
+        perm = np.argsort(rng.random((size, n)), axis=1)[:, :n_a]
+        sum_a = pooled[:, perm].sum(axis=2)  # (pairs, size)
+        diff = sum_a / n_a - (totals - sum_a) / n_b
+        extreme += (np.abs(diff) >= threshold).sum(axis=1)
+    return (extreme + 1) / (n_resamples + 1)
+
+
+def _permutation_task(task):
+    pooled, n_a, n_resamples, seed = task
+    return permutation_pvalues(pooled, n_a, n_resamples, seed)
+
+
+def resample_metric(groups, metric, n_resamples=DEFAULT_RESAMPLES, ci=0.95, seed=0, executor=None):
+    """
+    Bootstrap CIs and permutation p-values for all engine pairs of one metric.
+
+    Args:
+      - groups: dict engine -> NumPy array of values (see StatsEngine.groups).
+      - executor: optional concurrent.futures executor for the permutation tasks.
+
+    Returns a DataFrame with one row per ordered pair (A, B), A != B: the mean
+    difference A - B, its bootstrap CI and the permutation p-value. Each
+    unordered pair is resampled once and mirrored.
+    """
+    engines = [engine for engine, values in groups.items() if len(values) >= 2]
+    seeds = np.random.SeedSequence(seed)
+    boot_seed, perm_seed = seeds.spawn(2)
+    boot_rng = np.random.default_rng(boot_seed)
+    boot = np.stack([bootstrap_means(groups[engine], n_resamples, boot_rng) for engine in engines]) \
+        if engines else np.empty((0, n_resamples))
+    means = np.array([groups[engine].mean() for engine in engines])
+
+    pairs = [(i, j) for i in range(len(engines)) for j in range(i + 1, len(engines))]
+    if not pairs:
+        return pd.DataFrame()
+
+    # Bootstrap CI of the mean difference for all i < j pairs by broadcasting
+    ii, jj = np.array(pairs).T
+    alpha = (1 - ci) / 2
+    ci_low, ci_high = np.quantile(boot[ii] - boot[jj], [alpha, 1 - alpha], axis=1)
+
+    # Permutation tests: pairs with equal group sizes share index matrices
+    tasks, task_pairs = [], []
+    by_size = {}
+    for k, (i, j) in enumerate(pairs):
+        by_size.setdefault((len(groups[engines[i]]), len(groups[engines[j]])), []).append(k)
+    task_seeds = iter(perm_seed.spawn(sum(-(-len(ks) // PAIRS_PER_TASK) for ks in by_size.values())))
+    for (n_a, _), ks in sorted(by_size.items()):
+        for start in range(0, len(ks), PAIRS_PER_TASK):
+            chunk = ks[start:start + PAIRS_PER_TASK]
+            pooled = np.stack([np.concatenate([groups[engines[ii[k]]], groups[engines[jj[k]]]]) for k in chunk])
+            tasks.append((pooled, n_a, n_resamples, next(task_seeds)))
+            task_pairs.append(chunk)
+    results = executor.map(_permutation_task, tasks) if executor else map(_permutation_task, tasks)
+    p_values = np.empty(len(pairs))
+    for chunk, p in zip(task_pairs, results):
+        p_values[chunk] = p
+
+    rows = []
+    for k, (i, j) in enumerate(pairs):
+        diff = means[i] - means[j]
+        for eng_a, eng_b, sign in ((engines[i], engines[j], 1), (engines[j], engines[i], -1)):
+            low, high = (ci_low[k], ci_high[k]) if sign > 0 else (-ci_high[k], -ci_low[k])
+            rows.append({
+                "Metric": metric,
+                "Engine A": eng_a,
+                "Engine B": eng_b,
+                "Mean Difference (A - B)": sign * diff,
+                "CI Low": low,
+                "CI High": high,
+                "Permutation p-value": p_values[k],
+            })
+    return pd.DataFrame(rows)
+
+
+def resample_comparisons(stats_engine, metrics, n_resamples=DEFAULT_RESAMPLES, ci=0.95, seed=0, workers=1):
+    """Run resample_metric for each metric, spreading engine pairs over `workers` processes."""
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            frames = [resample_metric(stats_engine.groups(metric), metric, n_resamples, ci, seed, executor)
+                      for metric in metrics]
+    else:
+        frames = [resample_metric(stats_engine.groups(metric), metric, n_resamples, ci, seed)
+                  for metric in metrics]
+    return pd.concat(frames, ignore_index=True)
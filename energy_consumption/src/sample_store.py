@@ -0,0 +1,176 @@
+"""
+Memory-mapped, time-indexed store of raw EnergiBridge samples.
+
+The store is built once from energy_log.csv: every column is written as a raw
+binary file sorted by Time. Time-range queries binary-search the memory-mapped
+Time column and return zero-copy NumPy views, so pulling one window out of a
+long log only touches the pages it needs.
+
+Usage: python src/sample_store.py <search engine> <iteration>
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from config import ENERGY_LOG_FILE, TIMESTAMPS_FILE
+from energy_engine import derive_power, detect_energy_key, nanmean
+from energy_io import DEFAULT_CHUNKSIZE, schema_dtypes
+
+SAMPLE_STORE_DIR = os.getenv("SAMPLE_STORE_DIR", ".cache/samples")
+
+
+def _column_file(path, i):
+    return os.path.join(path, f"{i}.bin")
+
+
+def _swap_in(build_path, path):
+    """Move the directory build_path to `path`, replacing the store there."""
+    old_path = f"{build_path}.old"
+    if os.path.exists(path):
+        # Open memmaps keep the old files readable until they are closed
+        os.rename(path, old_path)
+    try:
+        os.replace(build_path, path)
+    except OSError:
+        # A concurrent build placed its store first; it is built from the same log
+        pass
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+class SampleStore:
+    """Read-only view over a sample store directory created by `SampleStore.build`."""
+
+    def __init__(self, path=SAMPLE_STORE_DIR):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.attrs = self.meta["attrs"]
+        self.columns = [column["name"] for column in self.meta["columns"]]
+        self._arrays = {}
+        for i, column in enumerate(self.meta["columns"]):
+            if self.meta["rows"]:
+                self._arrays[column["name"]] = np.memmap(_column_file(path, i), dtype=column["dtype"],
+                                                         mode="r", shape=(self.meta["rows"],))
+            else:
+                self._arrays[column["name"]] = np.empty(0, dtype=column["dtype"])
+        self.times = self._arrays["Time"]
+
+    @classmethod
+    def build(cls, energy_file=ENERGY_LOG_FILE, path=SAMPLE_STORE_DIR, chunksize=DEFAULT_CHUNKSIZE):
+        """
+        Convert `energy_file` into a sample store at `path`, streaming it in chunks.
+
+        The store is built in a temporary directory next to `path` and then
+        swapped in, so stores opened elsewhere keep reading their own files.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        build_path = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.build-", dir=parent)
+        try:
+            cls._write(energy_file, build_path, chunksize)
+            _swap_in(build_path, path)
+        finally:
+            shutil.rmtree(build_path, ignore_errors=True)
+        return cls(path)
+
+    @staticmethod
+    def _write(energy_file, path, chunksize):
+        """Write the column files and meta.json of a store for `energy_file` into the directory `path`."""
+        header = pd.read_csv(energy_file, nrows=0).columns
+        dtypes = schema_dtypes(header)
+        files = [open(_column_file(path, i), "wb") for i in range(len(header))]
+        rows, last_time, is_sorted = 0, None, True
+        try:
+            for chunk in pd.read_csv(energy_file, dtype=dtypes, chunksize=chunksize):
+                times = chunk["Time"].to_numpy()
+                is_sorted &= chunk["Time"].is_monotonic_increasing and (last_time is None or times[0] >= last_time)
+                last_time = times[-1]
+                rows += len(chunk)
+                for f, col in zip(files, header):
+                    f.write(chunk[col].to_numpy(dtype=dtypes[col]).tobytes())
+        finally:
+            for f in files:
+                f.close()
+
+        if not is_sorted:
+            # Reorder one column at a time so memory stays bounded by a single column
+            time_idx = list(header).index("Time")
+            order = np.argsort(np.fromfile(_column_file(path, time_idx), dtype=dtypes["Time"]), kind="stable")
+            for i, col in enumerate(header):
+                np.fromfile(_column_file(path, i), dtype=dtypes[col])[order].tofile(_column_file(path, i))
+
+        stat = os.stat(energy_file)
+        meta = {
+            "source": os.path.abspath(energy_file), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "rows": rows, "attrs": {"energy_key": detect_energy_key(header)},
+            "columns": [{"name": col, "dtype": dtypes[col]} for col in header],
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def open(cls, energy_file=ENERGY_LOG_FILE, path=SAMPLE_STORE_DIR):
+        """Open the store for `energy_file`, (re)building it if missing or stale."""
+        try:
+            store = cls(path)
+            stat = os.stat(energy_file)
+            if (store.meta["source"] == os.path.abspath(energy_file) and store.meta["size"] == stat.st_size
+                    and store.meta["mtime_ns"] == stat.st_mtime_ns):
+                return store
+        except (OSError, ValueError, KeyError):
+            pass
+        return cls.build(energy_file, path)
+
+    def __len__(self):
+        return len(self.times)
+
+    def locate(self, start, end):
+        """Row range [lo, hi) of the samples with start <= Time <= end."""
+        lo = int(np.searchsorted(self.times, start, side="left"))
+        hi = int(np.searchsorted(self.times, end, side="right"))
+        return lo, max(hi, lo)
+
+    def window(self, start, end, columns=None):
+        """Zero-copy views of `columns` (default: all) for start <= Time <= end (ms)."""
+        lo, hi = self.locate(start, end)
+        return {col: self._arrays[col][lo:hi] for col in (columns or self.columns)}
+
+    def window_power(self, start, end):
+        """Time (ms) and power (W) of the samples in [start, end], derived as in process_energy."""
+        key = self.attrs["energy_key"]
+        lo, hi = self.locate(start, end)
+        values, delta = self._arrays[key], self._arrays["Delta"]
+        power, _ = derive_power(values[lo:hi], delta[lo:hi], self.times[lo:hi], key)
+        return self.times[lo:hi], power
+
+    def to_frame(self, start, end, columns=None):
+        """DataFrame of one time range, e.g. for ad-hoc inspection."""
+        return pd.DataFrame(self.window(start, end, columns), copy=False)
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1])
+        return
+    engine, iteration = sys.argv[1], int(sys.argv[2])
+    timestamps_df = pd.read_csv(TIMESTAMPS_FILE)
+    rows = timestamps_df[(timestamps_df["Search Engine"] == engine) & (timestamps_df["Iteration"] == iteration)]
+    if rows.empty:
+        print(f"No timestamps for {engine} iteration {iteration}")
+        return
+
+    store = SampleStore.open()
+    for _, row in rows.iterrows():
+        times, power = store.window_power(row["Start Time"], row["End Time"])
+        print(f"{engine} iteration {iteration}: {len(times)} samples, "
+              f"mean power {nanmean(power):.2f} W")
+        print(store.to_frame(row["Start Time"], row["End Time"]).describe().T)
+
+
+if __name__ == "__main__":
+    main()
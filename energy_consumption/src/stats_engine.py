@@ -0,0 +1,215 @@
+"""
+Grouped statistics engine for the per-iteration energy results.
+
+Groups results_df once into per-engine NumPy arrays, caches the Shapiro-Wilk
+normality test of every group and runs each pairwise test once per unordered
+pair of engines, mirroring it for the reversed pair.
+"""
+
+import numpy as np
+import pandas as pd
+
+from config import lazy_import
+from instrumentation import log_message
+
+stats = lazy_import("scipy.stats")
+
+METRICS = ["Total Energy (J)", "Average Power (W)"]
+
+
+def remove_outliers_iqr(values):
+    """Drop values outside [Q1 - 1.5 IQR, Q3 + 1.5 IQR]."""
+    q1, q3 = np.quantile(values, [0.25, 0.75])
+    iqr = q3 - q1
+    return values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+
+
+class StatsEngine:
+    """Per-engine statistics over results_df, computed lazily and cached."""
+
+    def __init__(self, results_df, group_col="Search Engine"):
+        self.results_df = results_df
+        self.codes, uniques = pd.factorize(results_df[group_col])
+        self.engines = list(uniques)
+        self._order = np.argsort(self.codes, kind="stable")
+        self._bounds = np.cumsum(np.bincount(self.codes[self.codes >= 0], minlength=len(self.engines)))[:-1]
+        self._groups = {}
+        self._normality = {}
+        self._pairwise = {}
+        self._known_normality = {}
+        self._known_pairs = {}
+
+    def preload(self, engines, normality_df=None, pairwise_df=None):
+        """
+        Reuse saved normality and pairwise results for `engines` whose data did not change.
+
+        `normality_df` and `pairwise_df` are the tables written by process_energy
+        (statistical_tests.csv and pairwise_comparisons.csv). Pairs are reused
+        only if both engines are in `engines`.
+        """
+        engines = set(engines)
+        if normality_df is not None:
+            for row in normality_df[normality_df["Search Engine"].isin(engines)].to_dict("records"):
+                is_normal = row["Is Normal"]
+                self._known_normality.setdefault(row["Metric"], {})[row["Search Engine"]] = {
+                    "initial_stat": row["Initial Stat"], "initial_p": row["Initial p-value"],
+                    "filtered_stat": row["Filtered Stat"], "filtered_p": row["Filtered p-value"],
+                    "is_normal": None if pd.isna(is_normal) else is_normal in (True, "True"),
+                }
+        if pairwise_df is not None:
+            known = pairwise_df[pairwise_df["Engine A"].isin(engines) & pairwise_df["Engine B"].isin(engines)]
+            for row in known.to_dict("records"):
+                self._known_pairs.setdefault(row["Metric"], {})[row["Engine A"], row["Engine B"]] = (
+                    row["Test Used"], row["Statistic"], row["p-value"], row["Effect Size"])
+
+    def groups(self, metric):
+        """Non-NaN values of `metric` per engine, as a dict of NumPy arrays."""
+        if metric not in self._groups:
+            values = self.results_df[metric].to_numpy(dtype=np.float64)[self._order[self.codes[self._order] >= 0]]
+            groups = {}
+            for engine, group in zip(self.engines, np.split(values, self._bounds)):
+                n_nan = np.isnan(group).sum()
+                if n_nan:
+                    log_message(f"{n_nan} NaN values for {engine} - {metric}")
+                groups[engine] = group[~np.isnan(group)]
+            self._groups[metric] = groups
+        return self._groups[metric]
+
+    def normality(self, metric):
+        """
+        Shapiro-Wilk test per engine, retested after IQR outlier removal if p < 0.05.
+
+        Returns (details, all_normal) where details maps each engine to a dict
+        with 'initial_stat', 'initial_p', 'filtered_stat', 'filtered_p' and
+        'is_normal' (None if there is not enough data).
+        """
+        if metric in self._normality:
+            return self._normality[metric]
+
+        details = {}
+        all_normal = True
+        known = self._known_normality.get(metric, {})
+        for engine, values in self.groups(metric).items():
+            if engine in known:
+                details[engine] = known[engine]
+                if known[engine]["is_normal"] is False:
+                    all_normal = False
+                continue
+            detail = dict.fromkeys(["initial_stat", "initial_p", "filtered_stat", "filtered_p", "is_normal"])
+            details[engine] = detail
+            if len(values) < 3:
+                continue  # Not enough data to assess normality
+
+            stat, p = stats.shapiro(values)
+            detail["initial_stat"], detail["initial_p"] = stat, p
+            log_message(f"{engine} - {metric} (initial): stat={stat:.4f}, p={p:.4f}")
+            if p >= 0.05:
+                detail["is_normal"] = True
+                log_message(f"{engine} - {metric}: Data is normal.")
+                continue
+
+            filtered = remove_outliers_iqr(values)
+            if len(filtered) < 3:
+                detail["is_normal"] = False
+                log_message(f"{engine} - {metric}: Not enough data after outlier removal.")
+            else:
+                stat2, p2 = stats.shapiro(filtered)
+                detail["filtered_stat"], detail["filtered_p"] = stat2, p2
+                log_message(f"{engine} - {metric} (filtered): stat={stat2:.4f}, p={p2:.4f}")
+                detail["is_normal"] = bool(p2 >= 0.05)
+                if detail["is_normal"]:
+                    log_message(f"{engine} - {metric}: Data is normal after outlier removal.")
+                else:
+                    log_message(f"{engine} - {metric}: Data is non-normal even after outlier removal.")
+            if not detail["is_normal"]:
+                all_normal = False
+
+        self._normality[metric] = (details, all_normal)
+        return self._normality[metric]
+
+    def _compare(self, data_a, data_b, is_normal):
+        """Test one ordered pair; returns (test_used, statistic, p_value, effect_size)."""
+        if is_normal:
+            # Welch's t-test with Cohen's d using the pooled standard deviation
+            statistic, p_val = stats.ttest_ind(data_a, data_b, equal_var=False)
+            pooled_std = np.sqrt((data_a.std(ddof=1) ** 2 + data_b.std(ddof=1) ** 2) / 2)
+            effect_size = (data_a.mean() - data_b.mean()) / pooled_std if pooled_std > 0 else np.nan
+            return "Welch t-test", statistic, p_val, effect_size
+        # Mann-Whitney U test, with U / (n1 * n2) as effect size as in lectures
+        statistic, p_val = stats.mannwhitneyu(data_a, data_b, alternative="two-sided")
+        return "Mann-Whitney U", statistic, p_val, statistic / (len(data_a) * len(data_b))
+
+    def pairwise(self, metric, normality_details=None):
+        """
+        Pairwise tests between all engines for `metric`.
+
+        Welch's t-test is used when both groups are normal, the Mann-Whitney U
+        test otherwise. Only pairs i <= j are tested; (j, i) is mirrored from
+        (i, j). Returns a long DataFrame with one row per ordered pair.
+        """
+        use_cache = normality_details is None
+        if use_cache and metric in self._pairwise:
+            return self._pairwise[metric]
+        if use_cache:
+            normality_details = {metric: self.normality(metric)[0]}
+
+        groups = self.groups(metric)
+        means = {engine: values.mean() if len(values) else np.nan for engine, values in groups.items()}
+        known = self._known_pairs.get(metric, {}) if use_cache else {}
+        tested = {}
+        for i, eng_a in enumerate(self.engines):
+            for eng_b in self.engines[i:]:
+                if (eng_a, eng_b) in known and (eng_b, eng_a) in known:
+                    tested[eng_a, eng_b] = known[eng_a, eng_b]
+                    tested[eng_b, eng_a] = known[eng_b, eng_a]
+                    continue
+                data_a, data_b = groups[eng_a], groups[eng_b]
+                if len(data_a) < 2 or len(data_b) < 2:
+                    print(f"Not enough data for {eng_a} vs. {eng_b}")
+                    continue
+                is_normal = (normality_details[metric][eng_a]["is_normal"] is True and
+                             normality_details[metric][eng_b]["is_normal"] is True)
+                test_used, statistic, p_val, effect_size = self._compare(data_a, data_b, is_normal)
+                tested[eng_a, eng_b] = (test_used, statistic, p_val, effect_size)
+                if eng_a != eng_b:
+                    # Welch's t and Cohen's d change sign, U becomes n1 * n2 - U
+                    if is_normal:
+                        tested[eng_b, eng_a] = (test_used, -statistic, p_val, -effect_size)
+                    else:
+                        statistic_ba = len(data_a) * len(data_b) - statistic
+                        tested[eng_b, eng_a] = (test_used, statistic_ba, p_val, 1 - effect_size)
+
+        rows = []
+        for eng_a in self.engines:
+            for eng_b in self.engines:
+                if (eng_a, eng_b) not in tested:
+                    continue
+                test_used, statistic, p_val, effect_size = tested[eng_a, eng_b]
+                mean_a, mean_b = means[eng_a], means[eng_b]
+                rows.append({
+                    "Metric": metric,
+                    "Engine A": eng_a,
+                    "Engine B": eng_b,
+                    "Mean A": mean_a,
+                    "Mean B": mean_b,
+                    "Test Used": test_used,
+                    "Statistic": statistic,
+                    "p-value": p_val,
+                    "Effect Size": effect_size,
+                    "Percentage Change (%)": (mean_b - mean_a) / mean_a * 100 if mean_a != 0 else np.nan,
+                })
+        comp_df = pd.DataFrame(rows)
+        if use_cache:
+            self._pairwise[metric] = comp_df
+        return comp_df
+
+    def pairwise_matrices(self, metric):
+        """Effect-size and p-value matrices (Engine A x Engine B) for `metric`."""
+        comp_df = self.pairwise(metric)
+        if comp_df.empty:
+            empty = pd.DataFrame(index=self.engines, columns=self.engines, dtype=float)
+            return empty, empty.copy()
+        effect = comp_df.pivot(index="Engine A", columns="Engine B", values="Effect Size")
+        p_values = comp_df.pivot(index="Engine A", columns="Engine B", values="p-value")
+        return (effect.reindex(index=self.engines, columns=self.engines),
+                p_values.reindex(index=self.engines, columns=self.engines))
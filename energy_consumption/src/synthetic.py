@@ -0,0 +1,206 @@
+"""
+Synthetic EnergiBridge logs and matching search_engine_timestamps.csv files.
+
+The generated campaign follows measure.py: every iteration visits the search
+engines in a shuffled order, each query draws an engine-specific amount of
+extra power for a few seconds and is followed by the DEFAULT_DURATION wait,
+and EnergiBridge samples the whole campaign at a fixed interval with jitter.
+The log is generated and written in chunks, so campaigns of 1e8 samples need
+no more memory than one chunk.
+
+Usage: python src/synthetic.py <out_dir> [--samples N] [--interval-ms MS]
+[--engines N] [--iterations N] [--duration S] [--seed N]
+"""
+import argparse
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from config import (BASELINE_FILE, DEFAULT_DURATION, ENERGY_LOG_FILE, ITERATIONS, SEARCH_ENGINES,
+                    TIMESTAMPS_FILE)
+
+DEFAULT_INTERVAL_MS = 200  # EnergiBridge's default sampling interval
+CHUNK_ROWS = 500_000
+START_MS = 1_740_698_538_019  # Start of the first query, in ms since the epoch
+GAP_MS = (10, 300)  # Pause between two queries (internet check, cookie cleanup)
+MEAN_QUERY_MS = 5_000  # Rough mean time until the results are shown, for plan_campaign
+
+CPU_CORES, TEMP_SENSORS = 8, 10
+TOTAL_MEMORY, TOTAL_SWAP, USED_SWAP = 17_179_869_184, 3_221_225_472, 1_747_517_440
+IDLE_POWER_W = 8.0
+CPU_FREQUENCY = 3228
+
+
+def engine_names(n):
+    """The first n engines of SEARCH_ENGINES, padded with "Engine <i>" names."""
+    names = list(SEARCH_ENGINES)[:n]
+    return names + [f"Engine {i}" for i in range(len(names) + 1, n + 1)]
+
+
+def plan_campaign(samples, engines, interval_ms, duration_s=DEFAULT_DURATION, min_iterations=3):
+    """
+    (iterations, interval_ms) of a campaign whose log has about `samples` rows.
+
+    The iterations are scaled to the sample count at `interval_ms`; small
+    campaigns keep `min_iterations` and sample less often instead.
+    """
+    cycle_ms = duration_s * 1000 + MEAN_QUERY_MS + np.mean(GAP_MS)
+    iterations = max(min_iterations, round(samples * interval_ms / (engines * cycle_ms)))
+    return iterations, engines * iterations * cycle_ms / samples
+
+
+def make_campaign(engines, iterations, duration_s, rng):
+    """
+    Timestamps of a synthetic campaign and the busy interval of each query.
+
+    Returns (timestamps_df, busy_ends, baseline): the rows measure.py writes,
+    the end (ms) of the part of each query that draws extra power, and the
+    baseline overhead (ms) per engine.
+    """
+    baseline = {engine: rng.uniform(9_000, 16_000) for engine in engines}
+    rows, busy_ends = [], []
+    now = START_MS
+    for iteration in range(1, iterations + 1):
+        for engine in rng.permutation(engines):
+            # The page load is part of the baseline overhead; the search itself takes 1-4 s more
+            query_ms = int(baseline[engine] / 4 + rng.lognormal(np.log(2_000), 0.35))
+            end = now + query_ms + duration_s * 1000
+            raw = end - now
+            rows.append({
+                "Search Engine": engine,
+                "Start Time": now,
+                "End Time": end,
+                "Raw Duration (ms)": raw,
+                "Baseline Overhead (ms)": round(baseline[engine], 2),
+                "Normalized Duration (ms)": raw - round(baseline[engine], 2),
+                "Iteration": iteration,
+            })
+            busy_ends.append(now + query_ms)
+            now = end + int(rng.integers(*GAP_MS))
+    return pd.DataFrame(rows), np.asarray(busy_ends, dtype=np.int64), baseline
+
+
+@lru_cache(maxsize=None)
+def number_strings(step, count):
+    """Decimal strings of 0, step, ..., (count - 1) * step followed by "NaN"."""
+    return np.array([str(round(k * step, 6)) for k in range(count)] + ["NaN"], dtype=object)
+
+
+def formatted(values, step, count):
+    """
+    values rounded to multiples of `step` and formatted as strings.
+
+    Formatting is a table lookup, which writes a lot faster than floats; NaN
+    values are written as "NaN", like EnergiBridge does.
+    """
+    codes = np.rint(np.nan_to_num(values, nan=-1) / step).astype(np.int64)
+    codes = np.where(np.isnan(values) | (codes < 0) | (codes >= count), count, codes)
+    return number_strings(step, count)[codes]
+
+
+def log_chunk(times, busy_level, rng, memory_start):
+    """One chunk of EnergiBridge rows at `times`; busy_level is the extra power per sample."""
+    n = len(times)
+    busy = busy_level > 0
+    columns = {"Delta": None, "Time": times}
+    for i in range(CPU_CORES):
+        columns[f"CPU_FREQUENCY_{i}"] = np.full(n, CPU_FREQUENCY, dtype=np.int64)
+    temperature = 58 + 4 * busy + rng.normal(0, 0.5, n)
+    for i in range(TEMP_SENSORS):
+        # Sensors report in steps of 1/8 degree, each with a fixed offset
+        columns[f"CPU_TEMP_{i}"] = formatted(temperature + (i % 5 - 2), 0.125, 1_200)
+    for i in range(CPU_CORES):
+        usage = np.where(busy, rng.integers(20, 101, n), rng.integers(0, 16, n)).astype(np.float64)
+        usage[rng.random(n) < 0.01] = np.nan  # EnergiBridge misses some per-core readings
+        columns[f"CPU_USAGE_{i}"] = formatted(usage, 1, 101)
+    # Idle power with a slow drift, plus the query's extra power and occasional spikes
+    drift = 0.5 * np.sin(2 * np.pi * (times - START_MS) / 600_000)
+    spikes = np.where(busy & (rng.random(n) < 0.02), rng.exponential(8, n), 0)
+    power = IDLE_POWER_W + drift + busy_level + spikes + rng.normal(0, 0.6, n)
+    columns["SYSTEM_POWER (Watts)"] = formatted(power, 0.001, 300_000)
+    columns["TOTAL_MEMORY"] = np.full(n, TOTAL_MEMORY, dtype=np.int64)
+    columns["TOTAL_SWAP"] = np.full(n, TOTAL_SWAP, dtype=np.int64)
+    memory = memory_start + np.cumsum(rng.normal(0, 2e5, n) + 4e5 * (busy - 0.05))
+    columns["USED_MEMORY"] = np.clip(memory, 8e9, 1.6e10).astype(np.int64)
+    columns["USED_SWAP"] = np.full(n, USED_SWAP, dtype=np.int64)
+    return columns
+
+
+def write_energy_log(energy_file, timestamps_df, busy_ends, interval_ms, rng, chunk_rows=CHUNK_ROWS):
+    """
+    Write an EnergiBridge log sampling the campaign every interval_ms (with jitter).
+
+    Samples inside a query's busy interval get that engine's extra power.
+    Returns the number of rows written.
+    """
+    engines = sorted(timestamps_df["Search Engine"].unique())
+    level = dict(zip(engines, rng.uniform(6, 18, len(engines))))
+    busy_starts = timestamps_df["Start Time"].to_numpy(dtype=np.int64)
+    busy_levels = timestamps_df["Search Engine"].map(level).to_numpy()
+    first, last = busy_starts[0] - 5_000, timestamps_df["End Time"].iloc[-1] + 5_000
+
+    rows, clock, previous, memory = 0, float(first), first, 1.17e10
+    with open(energy_file, "w", newline="") as f:
+        while clock <= last:
+            # Jittered sample clock; EnergiBridge timestamps are whole milliseconds
+            steps = np.maximum(rng.normal(interval_ms, 0.02 * interval_ms, chunk_rows), 0.1)
+            clocks = clock + np.cumsum(steps)
+            clocks = clocks[clocks <= last]
+            if len(clocks) == 0:
+                break
+            clock = clocks[-1]
+            times = clocks.astype(np.int64)
+            window = np.searchsorted(busy_starts, times, side="right") - 1
+            is_busy = (window >= 0) & (times < busy_ends[np.maximum(window, 0)])
+            columns = log_chunk(times, np.where(is_busy, busy_levels[np.maximum(window, 0)], 0.0), rng, memory)
+            columns["Delta"] = np.diff(times, prepend=previous)
+            previous, memory = times[-1], float(columns["USED_MEMORY"][-1])
+            pd.DataFrame(columns).to_csv(f, header=rows == 0, index=False)
+            rows += len(times)
+    return rows
+
+
+def generate(out_dir, engines=len(SEARCH_ENGINES), iterations=ITERATIONS, duration_s=DEFAULT_DURATION,
+             interval_ms=DEFAULT_INTERVAL_MS, samples=None, seed=0, chunk_rows=CHUNK_ROWS):
+    """
+    Write a synthetic campaign to out_dir, laid out like the energy_consumption directory.
+
+    Writes energy_log.csv, search_engine_results/search_engine_timestamps.csv
+    and baseline_average.csv. If `samples` is given, the iterations and the
+    interval are chosen by plan_campaign. Returns a dict describing the
+    campaign, including the number of log rows.
+    """
+    if samples is not None:
+        iterations, interval_ms = plan_campaign(samples, engines, interval_ms, duration_s)
+    rng = np.random.default_rng(seed)
+    timestamps_df, busy_ends, baseline = make_campaign(engine_names(engines), iterations, duration_s, rng)
+
+    os.makedirs(os.path.join(out_dir, os.path.dirname(TIMESTAMPS_FILE)), exist_ok=True)
+    timestamps_df.to_csv(os.path.join(out_dir, TIMESTAMPS_FILE), index=False)
+    pd.DataFrame({"Search Engine": list(baseline), "Baseline Duration (ms)": list(baseline.values())}).to_csv(
+        os.path.join(out_dir, BASELINE_FILE), sep=";", index=False)
+    rows = write_energy_log(os.path.join(out_dir, ENERGY_LOG_FILE), timestamps_df, busy_ends,
+                            interval_ms, rng, chunk_rows)
+    return {"engines": engines, "iterations": iterations, "duration_s": duration_s,
+            "interval_ms": interval_ms, "seed": seed, "windows": len(timestamps_df), "samples": rows}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic EnergiBridge log and timestamps file.")
+    parser.add_argument("out_dir", help="Directory to write the campaign to")
+    parser.add_argument("--samples", type=float, help="Approximate log rows; overrides --iterations")
+    parser.add_argument("--interval-ms", type=float, default=DEFAULT_INTERVAL_MS, help="Sampling interval in ms")
+    parser.add_argument("--engines", type=int, default=len(SEARCH_ENGINES), help="Number of search engines")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS, help="Iterations per search engine")
+    parser.add_argument("--duration", type=int, default=DEFAULT_DURATION, help="Wait after each query in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    campaign = generate(args.out_dir, args.engines, args.iterations, args.duration, args.interval_ms,
+                        int(args.samples) if args.samples else None, args.seed)
+    print(", ".join(f"{key}: {value}" for key, value in campaign.items()))
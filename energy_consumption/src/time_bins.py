@@ -0,0 +1,68 @@
+"""
+Time-binned aggregates of the per-sample export for time-series plots.
+
+Samples are binned by their offset from the window start and summarized per
+(search engine, time bin) at several resolutions: sample count, mean time
+offset and the mean, 5th and 95th percentile of power and used memory. The
+table is built once by process_energy, so plots read a few thousand rows
+instead of every sample.
+"""
+import numpy as np
+import pandas as pd
+
+TIME_BIN_RESOLUTIONS = [0.1, 1.0, 5.0]  # Bin widths in seconds
+PERCENTILES = [0.05, 0.95]
+VALUE_COLUMNS = {"Power (W)": "Power", "USED_MEMORY": "Memory"}
+
+
+def time_binned_aggregates(sample_df, resolutions=TIME_BIN_RESOLUTIONS):
+    """
+    Aggregate sample_df (see process_energy.export_samples) per engine and time bin.
+
+    Samples with a missing or negative power or missing memory value are
+    dropped, as in the time-series plots. Bins are centered on multiples of
+    the resolution. Returns a long DataFrame with one row per (resolution,
+    engine, bin).
+    """
+    columns = ["Resolution (s)", "Search Engine", "Time Bin (s)", "Time_s", "Samples"]
+    for name in VALUE_COLUMNS.values():
+        columns += [f"{name} Mean", f"{name} P5", f"{name} P95"]
+    if sample_df.empty or not {"Time", "Start_Time", *VALUE_COLUMNS}.issubset(sample_df.columns):
+        return pd.DataFrame(columns=columns)
+
+    power = sample_df["Power (W)"].to_numpy(dtype=np.float64)
+    memory = sample_df["USED_MEMORY"].to_numpy(dtype=np.float64)
+    keep = ~np.isnan(power) & ~np.isnan(memory) & (power >= 0)
+    engine_codes, engines = pd.factorize(sample_df["Search Engine"].to_numpy()[keep], sort=True)
+    time_s = (sample_df["Time"].to_numpy()[keep] - sample_df["Start_Time"].to_numpy()[keep]) / 1000.0
+    values = {"Power": power[keep], "Memory": memory[keep]}
+
+    tables = []
+    for resolution in resolutions:
+        # Same rounding as Series.round: scale, then round half to even
+        scale = 1 / resolution
+        bins = np.rint(time_s * scale).astype(np.int64)
+        first = bins.min(initial=0)
+        width = bins.max(initial=0) - first + 1
+        # One integer code per (engine, bin), ordered by engine, then bin
+        group_codes, groups = pd.factorize(engine_codes * width + (bins - first), sort=True)
+        counts = np.bincount(group_codes, minlength=len(groups))
+        table = {
+            "Resolution (s)": resolution,
+            "Search Engine": np.asarray(engines)[groups // width],
+            "Time Bin (s)": (groups % width + first) / scale,
+            "Time_s": np.bincount(group_codes, time_s, len(groups)) / counts,
+            "Samples": counts,
+        }
+        for name, column in values.items():
+            table[f"{name} Mean"] = np.bincount(group_codes, column, len(groups)) / counts
+            quantiles = pd.Series(column).groupby(group_codes).quantile(PERCENTILES).unstack()
+            table[f"{name} P5"] = quantiles[PERCENTILES[0]].to_numpy()
+            table[f"{name} P95"] = quantiles[PERCENTILES[1]].to_numpy()
+        tables.append(pd.DataFrame(table, columns=columns))
+    return pd.concat(tables, ignore_index=True)
+
+
+def select_resolution(binned_df, resolution):
+    """Rows of one resolution from a time_binned_aggregates table."""
+    return binned_df[np.isclose(binned_df["Resolution (s)"], resolution)]